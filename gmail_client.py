@@ -4,19 +4,27 @@ import io
 import csv
 import json
 import base64
+import hashlib
 import pickle
+import random
 import re
+import threading
 import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from html import unescape
 from email.utils import parseaddr
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from urllib.parse import parse_qs, unquote, urlparse
-from google.auth.exceptions import RefreshError
+from google.auth.exceptions import RefreshError, TransportError
 from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaIoBaseDownload, MediaIoBaseUpload
+import httplib2
 
 SCOPES = [
     'https://www.googleapis.com/auth/gmail.modify',
@@ -24,36 +32,109 @@ SCOPES = [
 ]
 
 PROCESSED_LABEL_NAME = "InvoiceExtractor-Processed"
+TOKEN_FILENAME = 'token.json'
+# Older installs cached a pickled Credentials object; migrated on first load.
+LEGACY_TOKEN_FILENAME = 'token.pickle'
+# Default server-side filter. No has:attachment here: S&B invoices arrive as
+# body-only emails and must still be returned.
+UNPROCESSED_QUERY = f"-label:{PROCESSED_LABEL_NAME}"
 MESSAGE_TEXT_MAX_CHARS = 100000
+# Gmail accepts at most 100 calls per batch HTTP request.
+GMAIL_BATCH_SIZE = 100
+# messages.batchModify accepts at most 1000 message IDs per call.
+GMAIL_BATCH_MODIFY_SIZE = 1000
+# Pending processed-label IDs are flushed once this many accumulate mid-run.
+LABEL_FLUSH_SIZE = 500
+# Only the parts of a full message that the download loop actually reads.
+FULL_MESSAGE_FIELDS = 'id,internalDate,snippet,payload'
+# Base64 characters decoded per write when saving an attachment (multiple of 4).
+ATTACHMENT_DECODE_CHUNK_CHARS = 1024 * 1024
+# Minimum seconds between "Checking email i/n" progress lines.
+PROGRESS_STATUS_INTERVAL = 0.25
+# Attachment types the invoice pipeline can parse; others are never downloaded.
+INVOICE_ATTACHMENT_EXTENSIONS = ('.pdf', '.png', '.jpg', '.jpeg', '.tiff')
+# Parallel attachments.get calls per email (each worker thread gets its own Http).
+ATTACHMENT_DOWNLOAD_WORKERS = 8
 
 
 class WrongAuthorizedAccountError(Exception):
     """Raised when OAuth succeeds with a disallowed Gmail account."""
 
 
+# Refresh the access token this long before it expires so it never lapses mid-run.
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+# Authenticated Gmail sessions reused across GmailClient instances in one process,
+# keyed by (token file, expected email).
+_SERVICE_CACHE = {}
+
+
+# Gmail returns these statuses for throttling and transient server trouble.
+RETRYABLE_HTTP_STATUSES = {429, 500, 502, 503, 504}
+# Retry-After values above this are capped so a run never stalls for minutes.
+MAX_RETRY_DELAY = 60
+# 403 reasons Gmail uses for quota exhaustion; other 403s are permission errors.
+RATE_LIMIT_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded'}
+# download_attachment result when the content was already saved from an earlier
+# email; no download record is emitted so that email keeps its sender metadata.
+DUPLICATE_ATTACHMENT = object()
+
+
+def _is_retryable_http_error(error):
+    status = getattr(error.resp, 'status', None)
+    if status in RETRYABLE_HTTP_STATUSES:
+        return True
+    return status == 403 and not RATE_LIMIT_REASONS.isdisjoint(_http_error_reasons(error))
+
+
+def _http_error_reasons(error):
+    """Return the errors[].reason values from a Google API error response body."""
+    try:
+        errors = json.loads(error.content.decode('utf-8'))['error']['errors']
+        return {str(item.get('reason', '')) for item in errors}
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return set()
+
+
+def _retry_after_seconds(error):
+    """Return the Retry-After delay Gmail sent with an HttpError, if any."""
+    try:
+        value = float(error.resp.get('retry-after'))
+    except (AttributeError, TypeError, ValueError):
+        return None
+    return max(0.0, min(value, MAX_RETRY_DELAY))
+
+
 def retry_with_backoff(func, max_retries=3, base_delay=2, status_callback=None):
-    """Execute a function with exponential backoff retry on failure."""
+    """Execute a function, retrying rate limits and transient network errors.
+
+    Waits for Gmail's Retry-After when present, otherwise exponential backoff
+    with jitter. Other HTTP errors (404, 400, ...) and programming errors are
+    raised immediately.
+    """
     for attempt in range(max_retries + 1):
         try:
             return func()
         except HttpError as e:
-            if attempt == max_retries:
+            if attempt == max_retries or not _is_retryable_http_error(e):
                 raise
-            delay = base_delay * (2 ** attempt)
+            delay = _retry_after_seconds(e)
+            if delay is None:
+                delay = base_delay * (2 ** attempt) * random.uniform(0.5, 1.0)
             if status_callback:
                 status_callback(
                     f"API error (attempt {attempt + 1}/{max_retries}): {e}. "
-                    f"Retrying in {delay}s...", "warning"
+                    f"Retrying in {delay:.1f}s...", "warning"
                 )
             time.sleep(delay)
-        except Exception as e:
+        except (OSError, httplib2.HttpLib2Error, TransportError) as e:
+            # Covers ConnectionError, socket timeouts and SSL errors.
             if attempt == max_retries:
                 raise
-            delay = base_delay * (2 ** attempt)
+            delay = base_delay * (2 ** attempt) * random.uniform(0.5, 1.0)
             if status_callback:
                 status_callback(
                     f"Error (attempt {attempt + 1}/{max_retries}): {e}. "
-                    f"Retrying in {delay}s...", "warning"
+                    f"Retrying in {delay:.1f}s...", "warning"
                 )
             time.sleep(delay)
 
@@ -298,6 +379,18 @@ def _safe_source_filename(value):
     return safe or 'email_invoice'
 
 
+def _select_headers(payload, names):
+    """Return {name: value} for just the wanted headers (first occurrence wins)."""
+    selected = {}
+    for header in payload.get('headers', ()):
+        name = header.get('name')
+        if name in names and name not in selected:
+            selected[name] = header.get('value', '')
+            if len(selected) == len(names):
+                break
+    return selected
+
+
 def _message_internal_timestamp(message):
     """Return Gmail's stored message timestamp as whole seconds."""
     raw = str((message or {}).get('internalDate', '') or '').strip()
@@ -337,6 +430,9 @@ def _message_matches_time_filter(message, message_time_filter):
 
 
 class GmailClient:
+    # Path separators and characters Windows rejects in filenames.
+    _FNAME_TRANS = str.maketrans({c: '_' for c in '/\\:*?"<>|'})
+
     def __init__(
         self,
         base_dir,
@@ -345,38 +441,148 @@ class GmailClient:
         invoices_dir=None,
         expected_email=None,
         should_stop=None,
+        download_workers=ATTACHMENT_DOWNLOAD_WORKERS,
+        attachment_extensions=INVOICE_ATTACHMENT_EXTENSIONS,
     ):
         self.base_dir = base_dir
         self.data_dir = data_dir or base_dir
         self.status_callback = status_callback or (lambda msg, tag=None: None)
         self.client_secret = os.path.join(self.data_dir, 'client_secret.json')
-        self.token_file = os.path.join(self.data_dir, 'token.pickle')
+        self.token_file = os.path.join(self.data_dir, TOKEN_FILENAME)
+        self.legacy_token_file = os.path.join(self.data_dir, LEGACY_TOKEN_FILENAME)
+        self.label_cache_file = os.path.join(self.data_dir, 'label_cache.json')
         self.invoices_dir = invoices_dir or os.path.join(self.data_dir, 'invoices')
         self.expected_email = str(expected_email or '').strip().lower()
         self.should_stop = should_stop or (lambda: False)
+        self.download_workers = max(1, int(download_workers or 1))
+        # None downloads every attachment regardless of type.
+        self.attachment_extensions = (
+            tuple(ext.lower() for ext in attachment_extensions)
+            if attachment_extensions else None
+        )
         self.service = None
+        self._resources = None
+        self._resources_service = None
+        self.creds = None
+        self._thread_local = threading.local()
+        self._refresh_lock = threading.Lock()
+        # sha256 of attachment data -> filename already saved by this client.
+        self._saved_by_hash = {}
+        self._saved_by_hash_lock = threading.Lock()
+        self._existing_names = None
+        self._existing_names_lock = threading.Lock()
+        self._pending_label_ids = []
 
         os.makedirs(self.invoices_dir, exist_ok=True)
 
+    def _gmail_resources(self):
+        """Return (messages, attachments, labels) resources, built once per service."""
+        if self._resources_service is not self.service:
+            users = self.service.users()
+            messages = users.messages()
+            self._resources = (messages, messages.attachments(), users.labels())
+            self._resources_service = self.service
+        return self._resources
+
+    @property
+    def _messages(self):
+        return self._gmail_resources()[0]
+
+    @property
+    def _attachments(self):
+        return self._gmail_resources()[1]
+
+    @property
+    def _labels(self):
+        return self._gmail_resources()[2]
+
+    def _service_cache_key(self):
+        return (os.path.abspath(self.token_file), self.expected_email)
+
     def _clear_cached_token(self):
-        """Delete cached token file so OAuth can run fresh."""
+        """Delete cached token files so OAuth can run fresh."""
+        _SERVICE_CACHE.pop(self._service_cache_key(), None)
+        for token_file in (self.token_file, self.legacy_token_file):
+            if os.path.exists(token_file):
+                try:
+                    os.remove(token_file)
+                except Exception as e:
+                    self.status_callback(
+                        f"Warning: couldn't remove cached token file: {e}",
+                        "warning"
+                    )
+
+    def _load_cached_credentials(self):
+        """Load cached credentials, migrating a legacy pickle token to JSON.
+
+        Returns:
+            tuple: (credentials or None, whether the token should be re-saved)
+        """
         if os.path.exists(self.token_file):
+            with open(self.token_file, encoding='utf-8') as f:
+                return Credentials.from_authorized_user_info(json.load(f), SCOPES), False
+        if os.path.exists(self.legacy_token_file):
+            with open(self.legacy_token_file, 'rb') as f:
+                return pickle.load(f), True
+        return None, False
+
+    def _save_credentials(self, creds):
+        with open(self.token_file, 'w', encoding='utf-8') as f:
+            f.write(creds.to_json())
+        if os.path.exists(self.legacy_token_file):
             try:
-                os.remove(self.token_file)
-            except Exception as e:
-                self.status_callback(
-                    f"Warning: couldn't remove cached token file: {e}",
-                    "warning"
+                os.remove(self.legacy_token_file)
+            except OSError:
+                pass
+
+    def _load_cached_label_id(self, email, label_name):
+        """Return the cached label ID for this account, or None."""
+        try:
+            with open(self.label_cache_file, encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if (
+            isinstance(cache, dict)
+            and cache.get('email') == email
+            and cache.get('label_name') == label_name
+        ):
+            return cache.get('label_id') or None
+        return None
+
+    def _save_cached_label_id(self, email, label_name, label_id):
+        try:
+            with open(self.label_cache_file, 'w', encoding='utf-8') as f:
+                json.dump(
+                    {'email': email, 'label_name': label_name, 'label_id': label_id},
+                    f,
                 )
+        except OSError as e:
+            self.status_callback(f"Warning: couldn't cache label ID: {e}", "warning")
+
+    def _clear_label_cache(self):
+        """Forget the cached label ID so the next run looks it up again."""
+        if os.path.exists(self.label_cache_file):
+            try:
+                os.remove(self.label_cache_file)
+            except OSError:
+                pass
 
     def authenticate(self):
         """Authenticate with Gmail API, caching token for future runs."""
+        cached = _SERVICE_CACHE.get(self._service_cache_key())
+        if cached and cached['creds'].valid and os.path.exists(self.token_file):
+            self.creds = cached['creds']
+            self.service = cached['service']
+            self.processed_label_id = cached['processed_label_id']
+            self.status_callback(f"Connected to: {cached['email']}", "success")
+            return cached['profile']
+
         creds = None
         should_persist_token = False
-        if os.path.exists(self.token_file):
+        if os.path.exists(self.token_file) or os.path.exists(self.legacy_token_file):
             try:
-                with open(self.token_file, 'rb') as f:
-                    creds = pickle.load(f)
+                creds, should_persist_token = self._load_cached_credentials()
             except Exception:
                 self.status_callback(
                     "Cached token file is unreadable; forcing re-authentication.",
@@ -453,13 +659,26 @@ class GmailClient:
             )
 
         if should_persist_token:
-            with open(self.token_file, 'wb') as f:
-                pickle.dump(creds, f)
+            self._save_credentials(creds)
 
         self.status_callback(f"Connected to: {connected_email}", "success")
 
-        # Ensure our processed label exists
-        self.processed_label_id = self._get_or_create_label(PROCESSED_LABEL_NAME)
+        # Ensure our processed label exists (cached per account to skip labels.list)
+        account_key = connected_email.lower()
+        self.processed_label_id = self._load_cached_label_id(account_key, PROCESSED_LABEL_NAME)
+        if not self.processed_label_id:
+            self.processed_label_id = self._get_or_create_label(PROCESSED_LABEL_NAME)
+            self._save_cached_label_id(
+                account_key, PROCESSED_LABEL_NAME, self.processed_label_id
+            )
+
+        _SERVICE_CACHE[self._service_cache_key()] = {
+            'creds': creds,
+            'service': self.service,
+            'profile': profile,
+            'email': connected_email,
+            'processed_label_id': self.processed_label_id,
+        }
 
         return profile
 
@@ -467,7 +686,7 @@ class GmailClient:
         """Get the ID of a label, creating it if it doesn't exist."""
         # List existing labels
         results = retry_with_backoff(
-            lambda: self.service.users().labels().list(userId='me').execute(),
+            lambda: self._labels.list(userId='me').execute(),
             status_callback=self.status_callback
         )
         labels = results.get('labels', [])
@@ -485,7 +704,7 @@ class GmailClient:
             'messageListVisibility': 'show',
         }
         created = retry_with_backoff(
-            lambda: self.service.users().labels().create(
+            lambda: self._labels.create(
                 userId='me', body=label_body
             ).execute(),
             status_callback=self.status_callback
@@ -493,79 +712,353 @@ class GmailClient:
         self.status_callback(f"Created new label: {label_name}", "success")
         return created['id']
 
-    def _add_label_to_message(self, msg_id, label_id):
-        """Add a label to a message."""
-        body = {'addLabelIds': [label_id]}
-        retry_with_backoff(
-            lambda: self.service.users().messages().modify(
-                userId='me', id=msg_id, body=body
-            ).execute(),
-            status_callback=self.status_callback
-        )
+    def _add_label_to_messages(self, msg_ids, label_id):
+        """Add a label to many messages with messages.batchModify (1000 IDs per call)."""
+        for start in range(0, len(msg_ids), GMAIL_BATCH_MODIFY_SIZE):
+            body = {
+                'ids': list(msg_ids[start:start + GMAIL_BATCH_MODIFY_SIZE]),
+                'addLabelIds': [label_id],
+            }
+            try:
+                retry_with_backoff(
+                    lambda: self._messages.batchModify(userId='me', body=body).execute(),
+                    status_callback=self.status_callback
+                )
+            except Exception as label_err:
+                # The cached label may have been deleted in Gmail; re-resolve next run.
+                self._clear_label_cache()
+                self.status_callback(
+                    f"    Warning: couldn't add label to {len(body['ids'])} email(s): {label_err}",
+                    "warning"
+                )
+
+    def _queue_label(self, msg_id):
+        """Mark a fully processed email for labeling in the next flush."""
+        self._pending_label_ids.append(msg_id)
+        if len(self._pending_label_ids) >= LABEL_FLUSH_SIZE:
+            self._flush_labels()
+
+    def _flush_labels(self):
+        """Apply the processed label to all pending emails."""
+        msg_ids, self._pending_label_ids = self._pending_label_ids, []
+        if not msg_ids:
+            return
+        try:
+            self._add_label_to_messages(msg_ids, self.processed_label_id)
+        except Exception as label_err:
+            self.status_callback(
+                f"    Warning: couldn't add label: {label_err}", "warning"
+            )
+
+    def _execute_batch(self, requests):
+        """Execute (request_id, request) pairs through Gmail batch HTTP calls.
+
+        Returns:
+            tuple: (dict of request_id -> response, dict of request_id -> exception)
+        """
+        responses = {}
+        errors = {}
+
+        def on_response(request_id, response, exception):
+            if exception is not None:
+                errors[request_id] = exception
+            else:
+                errors.pop(request_id, None)
+                responses[request_id] = response
+
+        for start in range(0, len(requests), GMAIL_BATCH_SIZE):
+            batch = self.service.new_batch_http_request(callback=on_response)
+            for request_id, request in requests[start:start + GMAIL_BATCH_SIZE]:
+                batch.add(request, request_id=request_id)
+            # A per-thread Http lets the next chunk prefetch run beside other calls.
+            retry_with_backoff(
+                lambda: batch.execute(http=self._thread_http()),
+                status_callback=self.status_callback
+            )
+
+        return responses, errors
 
     def fetch_all_message_ids(self, query=None):
-        """Fetch message IDs from Gmail, optionally filtered by a search query."""
-        all_messages = []
+        """Fetch message IDs (list of str) from Gmail matching a search query.
+
+        query=None searches unprocessed mail only (UNPROCESSED_QUERY); pass an
+        empty string to page through the whole mailbox.
+        """
+        if query is None:
+            query = UNPROCESSED_QUERY
+        msg_ids = []
         page_token = None
 
         while True:
             def list_messages(pt=page_token):
-                kwargs = {'userId': 'me', 'maxResults': 500}
+                kwargs = {
+                    'userId': 'me',
+                    'maxResults': 500,
+                    'fields': 'messages/id,nextPageToken',
+                }
                 if pt:
                     kwargs['pageToken'] = pt
                 if query:
                     kwargs['q'] = query
-                return self.service.users().messages().list(**kwargs).execute()
+                return self._messages.list(**kwargs).execute()
 
             results = retry_with_backoff(
                 lambda: list_messages(page_token),
                 status_callback=self.status_callback
             )
-            messages = results.get('messages', [])
-            all_messages.extend(messages)
+            msg_ids.extend(m['id'] for m in results.get('messages', ()))
 
             page_token = results.get('nextPageToken')
             if not page_token:
                 break
 
-        return all_messages
+        return msg_ids
+
+    def _message_get_kwargs(self, msg_id, fmt, metadata_headers=None):
+        kwargs = {'userId': 'me', 'id': msg_id, 'format': fmt}
+        if fmt == 'full':
+            kwargs['fields'] = FULL_MESSAGE_FIELDS
+        elif fmt == 'metadata' and metadata_headers:
+            kwargs['metadataHeaders'] = list(metadata_headers)
+        return kwargs
 
-    def get_message_details(self, msg_id):
-        """Get full message details including attachment info."""
+    def get_message_details(self, msg_id, fmt='full', metadata_headers=None):
+        """Get message details (full payload with attachment info by default)."""
+        kwargs = self._message_get_kwargs(msg_id, fmt, metadata_headers)
         return retry_with_backoff(
-            lambda: self.service.users().messages().get(
-                userId='me', id=msg_id, format='full'
-            ).execute(),
+            lambda: self._messages.get(**kwargs).execute(),
             status_callback=self.status_callback
         )
 
+    def get_messages_batch(self, msg_ids, fmt='full', metadata_headers=None):
+        """Fetch many messages with one batch HTTP call per GMAIL_BATCH_SIZE ids.
+
+        Returns:
+            dict: msg_id -> message. Messages that failed inside the batch are
+            omitted so callers can fall back to get_message_details().
+        """
+        messages = self._messages
+        responses, errors = self._execute_batch([
+            (msg_id, messages.get(**self._message_get_kwargs(msg_id, fmt, metadata_headers)))
+            for msg_id in msg_ids
+        ])
+        if errors:
+            self.status_callback(
+                f"  {len(errors)} email(s) failed in batch fetch; retrying individually.",
+                "warning"
+            )
+        return responses
+
+    def _prefetch_messages(self, msg_ids, message_time_filter=None):
+        """Batch-fetch full messages, skipping ones outside the time window.
+
+        With a time filter active, a cheap metadata pass runs first so messages
+        outside the window never pull their full MIME tree. Without one every
+        message is a candidate (body-only invoices have no attachments), so the
+        full fetch happens directly.
+
+        Returns:
+            tuple: (dict of msg_id -> full message, set of out-of-window msg_ids)
+        """
+        skipped_ids = set()
+        full_ids = list(msg_ids)
+        if message_time_filter:
+            metadata = self.get_messages_batch(
+                full_ids, fmt='metadata', metadata_headers=['Subject']
+            )
+            skipped_ids = {
+                msg_id for msg_id, msg in metadata.items()
+                if not _message_matches_time_filter(msg, message_time_filter)
+            }
+            full_ids = [msg_id for msg_id in full_ids if msg_id not in skipped_ids]
+        details = self.get_messages_batch(full_ids) if full_ids else {}
+        return details, skipped_ids
+
+    def _ensure_fresh_credentials(self):
+        """Refresh the access token ahead of expiry, between requests.
+
+        google-auth would otherwise refresh lazily inside whichever request
+        first sees an expired token, possibly on several download threads at once.
+        """
+        creds = self.creds
+        expiry = getattr(creds, 'expiry', None)
+        if not expiry or not getattr(creds, 'refresh_token', None):
+            return
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        if expiry - now > TOKEN_REFRESH_MARGIN:
+            return
+        with self._refresh_lock:
+            if creds.expiry - now > TOKEN_REFRESH_MARGIN:
+                return
+            try:
+                creds.refresh(Request())
+                self._save_credentials(creds)
+            except Exception as e:
+                self.status_callback(
+                    f"Warning: couldn't refresh authentication token early: {e}",
+                    "warning"
+                )
+
+    def _thread_http(self):
+        """Return an authorized Http for the current thread.
+
+        httplib2.Http is not thread-safe, so parallel downloads must not share
+        the connection owned by self.service.
+        """
+        if self.creds is None:
+            return None
+        http = getattr(self._thread_local, 'http', None)
+        if http is None:
+            http = AuthorizedHttp(self.creds, http=httplib2.Http())
+            self._thread_local.http = http
+        return http
+
+    def _open_unique_file(self, filename, mode, **open_kwargs):
+        """Create filename in invoices_dir, adding _1, _2... if it already exists.
+
+        Taken names are checked against a cached listing of invoices_dir; the
+        exclusive create guards against files appearing since that listing.
+
+        Returns:
+            tuple: (saved filename, full path, open file object)
+        """
+        name, ext = os.path.splitext(filename)
+        safe_filename = filename
+        counter = 1
+        with self._existing_names_lock:
+            if self._existing_names is None:
+                # One directory listing per client instead of a syscall per candidate.
+                self._existing_names = {entry.name for entry in os.scandir(self.invoices_dir)}
+            while True:
+                if safe_filename not in self._existing_names:
+                    filepath = os.path.join(self.invoices_dir, safe_filename)
+                    try:
+                        f = open(filepath, mode, **open_kwargs)
+                    except FileExistsError:
+                        # Created outside this client since the listing.
+                        pass
+                    else:
+                        self._existing_names.add(safe_filename)
+                        return safe_filename, filepath, f
+                    self._existing_names.add(safe_filename)
+                safe_filename = f"{name}_{counter}{ext}"
+                counter += 1
+
     def download_attachment(self, msg_id, attachment_id, filename):
-        """Download a single attachment and save to invoices folder."""
+        """Download a single attachment and save to invoices folder.
+
+        Returns the saved filename, or DUPLICATE_ATTACHMENT when identical
+        content was already saved by this client.
+        """
+        request = self._attachments.get(
+            userId='me', messageId=msg_id, id=attachment_id, fields='data'
+        )
         result = retry_with_backoff(
-            lambda: self.service.users().messages().attachments().get(
-                userId='me', messageId=msg_id, id=attachment_id
-            ).execute(),
+            lambda: request.execute(http=self._thread_http()),
             status_callback=self.status_callback
         )
-        file_data = base64.urlsafe_b64decode(result['data'])
+        data = result.pop('data')
+
+        # Identical files resent on several emails are saved (and parsed) once.
+        # Hashing the base64 text avoids decoding just to compare contents.
+        digest = hashlib.sha256(data.encode('ascii')).hexdigest()
+        with self._saved_by_hash_lock:
+            existing = self._saved_by_hash.get(digest)
+        if existing:
+            self.status_callback(
+                f"    {filename} is identical to {existing}; not saved again."
+            )
+            return DUPLICATE_ATTACHMENT
+        # Unbuffered: decoded slices go straight to the OS without a
+        # BufferedWriter copy.
+        safe_filename, filepath, f = self._open_unique_file(
+            filename.translate(self._FNAME_TRANS), 'xb', buffering=0
+        )
 
-        # Avoid filename collisions by prepending msg_id prefix
-        safe_filename = filename.replace('/', '_').replace('\\', '_')
-        filepath = os.path.join(self.invoices_dir, safe_filename)
+        # Decode in slices so a large attachment never needs a second full-size
+        # bytes copy next to its base64 text.
+        try:
+            with f:
+                for start in range(0, len(data), ATTACHMENT_DECODE_CHUNK_CHARS):
+                    chunk = memoryview(base64.urlsafe_b64decode(
+                        data[start:start + ATTACHMENT_DECODE_CHUNK_CHARS]
+                    ))
+                    # Raw writes may be partial.
+                    while chunk:
+                        chunk = chunk[f.write(chunk):]
+        except Exception:
+            os.remove(filepath)
+            raise
+
+        # Registered only once the file is complete, so no other download is
+        # ever pointed at a file that may still be removed.
+        with self._saved_by_hash_lock:
+            existing = self._saved_by_hash.setdefault(digest, safe_filename)
+        if existing != safe_filename:
+            # A concurrent download of the same content finished first.
+            os.remove(filepath)
+            self.status_callback(
+                f"    {filename} is identical to {existing}; not saved again."
+            )
+            return DUPLICATE_ATTACHMENT
+        return safe_filename
 
-        # If file already exists, add a numeric suffix
-        if os.path.exists(filepath):
-            name, ext = os.path.splitext(safe_filename)
-            counter = 1
-            while os.path.exists(filepath):
-                safe_filename = f"{name}_{counter}{ext}"
-                filepath = os.path.join(self.invoices_dir, safe_filename)
-                counter += 1
+    def _submit_attachment_downloads(self, pool, msg_id, attachments):
+        """Start downloading one email's attachments on the shared pool.
 
-        with open(filepath, 'wb') as f:
-            f.write(file_data)
+        Returns one future per attachment, in attachment order. A future's
+        result is the saved filename, DUPLICATE_ATTACHMENT when identical content
+        was already saved this run, or None when a stop was requested before
+        that attachment started. Without a pool, downloads run inline.
+        """
+        def download(att):
+            if self.should_stop():
+                return None
+            return self.download_attachment(
+                msg_id, att['attachment_id'], att['filename']
+            )
 
-        return safe_filename
+        futures = []
+        for att in attachments:
+            if pool is not None:
+                futures.append(pool.submit(download, att))
+                continue
+            future = Future()
+            futures.append(future)
+            try:
+                future.set_result(download(att))
+            except Exception as e:
+                future.set_exception(e)
+                break
+        return futures
+
+    def _collect_attachment_downloads(self, pending, downloaded_attachments):
+        """Wait for one email's downloads and record them in attachment order.
+
+        Returns:
+            bool: True when every attachment was saved, False when a stop
+            interrupted the email. Download errors are raised.
+        """
+        downloaded_attachments.extend(pending.get('records', ()))
+        saved_names = []
+        try:
+            for future in pending['futures']:
+                saved_name = future.result()
+                if saved_name is None:
+                    return False
+                if saved_name is DUPLICATE_ATTACHMENT:
+                    continue
+                saved_names.append(saved_name)
+                downloaded_attachments.append(
+                    dict(pending['entry'], filename=saved_name)
+                )
+        finally:
+            # One summary line per email instead of one per attachment.
+            if saved_names:
+                self.status_callback(
+                    f"    Downloaded: {', '.join(saved_names)}", "success"
+                )
+        return True
 
     def save_body_invoice_source(
         self,
@@ -581,15 +1074,6 @@ class GmailClient:
         order_number = _extract_sb_body_order_number(message_text, subject)
         base_name = f"SB_Order_{order_number}" if order_number else f"SB_Email_{msg_id[:12]}"
         safe_filename = _safe_source_filename(base_name) + '.email.json'
-        filepath = os.path.join(self.invoices_dir, safe_filename)
-
-        if os.path.exists(filepath):
-            name, ext = os.path.splitext(safe_filename)
-            counter = 1
-            while os.path.exists(filepath):
-                safe_filename = f"{name}_{counter}{ext}"
-                filepath = os.path.join(self.invoices_dir, safe_filename)
-                counter += 1
 
         payload = {
             'type': 'email_body_invoice',
@@ -601,20 +1085,24 @@ class GmailClient:
             'order_url': _extract_sb_body_order_url(message_text),
             'message_text': message_text,
         }
-        with open(filepath, 'w', encoding='utf-8') as f:
+        safe_filename, _, f = self._open_unique_file(safe_filename, 'x', encoding='utf-8')
+        with f:
             json.dump(payload, f, ensure_ascii=False, indent=2)
 
         return safe_filename
 
     def find_attachments_in_parts(self, parts, msg_id):
-        """Recursively find attachments in message parts."""
-        attachments = []
-        if not parts:
-            return attachments
+        """Find attachments in message parts, including nested multipart parts.
 
-        for part in parts:
+        Walks the MIME tree with an explicit stack (depth-first, in message
+        order). Pass [payload] to include a single-part message's own body.
+        """
+        attachments = []
+        stack = list(reversed(parts or ()))
+        while stack:
+            part = stack.pop()
             filename = part.get('filename', '')
-            body = part.get('body', {})
+            body = part.get('body') or {}
             attachment_id = body.get('attachmentId')
 
             if filename and attachment_id:
@@ -626,12 +1114,9 @@ class GmailClient:
                     'size': body.get('size', 0),
                 })
 
-            # Recurse into nested parts (multipart messages)
-            nested_parts = part.get('parts', [])
+            nested_parts = part.get('parts')
             if nested_parts:
-                attachments.extend(
-                    self.find_attachments_in_parts(nested_parts, msg_id)
-                )
+                stack.extend(reversed(nested_parts))
 
         return attachments
 
@@ -646,16 +1131,18 @@ class GmailClient:
             )
         """
         self.status_callback("Fetching email list...")
-        all_messages = self.fetch_all_message_ids(query=query)
-        total_emails = len(all_messages)
+        if query is None:
+            query = UNPROCESSED_QUERY
+        all_msg_ids = self.fetch_all_message_ids(query=query)
+        total_emails = len(all_msg_ids)
         if query:
             self.status_callback(f"Found {total_emails} email(s) matching filter.")
         else:
             self.status_callback(f"Found {total_emails} total emails in account.")
 
         # Use filtered results directly (label filtering is handled via Gmail query)
-        new_messages = all_messages
-        new_count = len(new_messages)
+        new_msg_ids = all_msg_ids
+        new_count = len(new_msg_ids)
 
         if new_count == 0:
             self.status_callback("No emails to process.", "success")
@@ -664,138 +1151,199 @@ class GmailClient:
         self.status_callback(f"Processing {new_count} new emails...")
 
         downloaded_attachments = []
+        message_details = {}
+        skipped_ids = set()
+        last_progress_ts = 0.0
+        # Fetches chunk N+1 in the background while chunk N downloads attachments.
+        prefetch_pool = ThreadPoolExecutor(max_workers=1)
+        next_chunk = None
+        # Attachment downloads overlap across emails, not just within one.
+        download_pool = (
+            ThreadPoolExecutor(max_workers=self.download_workers)
+            if self.download_workers > 1 else None
+        )
+        pending_downloads = deque()
+        stopped = False
 
-        for i, msg_data in enumerate(new_messages, 1):
-            if self.should_stop():
+        def finish_oldest_download():
+            pending = pending_downloads.popleft()
+            try:
+                completed = self._collect_attachment_downloads(
+                    pending, downloaded_attachments
+                )
+            except Exception as e:
                 self.status_callback(
-                    "Stop requested during Gmail download; leaving remaining emails untagged.",
-                    "warning",
+                    f"  Error processing email {pending['msg_id']}: {e}", "error"
                 )
-                break
-            msg_id = msg_data['id']
-            self.status_callback(f"Checking email {i}/{new_count}...")
+                return True
+            if completed:
+                self._queue_label(pending['msg_id'])
+                return True
+            self.status_callback(
+                "  Stop requested before email finished downloading; this email will remain untagged.",
+                "warning",
+            )
+            return False
 
-            try:
-                msg = self.get_message_details(msg_id)
-                if not _message_matches_time_filter(msg, message_time_filter):
+        try:
+            for i, msg_id in enumerate(new_msg_ids, 1):
+                if self.should_stop():
+                    self.status_callback(
+                        "Stop requested during Gmail download; leaving remaining emails untagged.",
+                        "warning",
+                    )
+                    break
+                self._ensure_fresh_credentials()
+                if (i - 1) % GMAIL_BATCH_SIZE == 0:
+                    # Fetch this chunk of messages in one batch HTTP call (usually
+                    # already in flight) and start on the following chunk.
+                    current_chunk = next_chunk or prefetch_pool.submit(
+                        self._prefetch_messages,
+                        new_msg_ids[i - 1:i - 1 + GMAIL_BATCH_SIZE],
+                        message_time_filter,
+                    )
+                    next_start = i - 1 + GMAIL_BATCH_SIZE
+                    next_chunk = None
+                    if next_start < new_count:
+                        next_chunk = prefetch_pool.submit(
+                            self._prefetch_messages,
+                            new_msg_ids[next_start:next_start + GMAIL_BATCH_SIZE],
+                            message_time_filter,
+                        )
+                    try:
+                        message_details, skipped_ids = current_chunk.result()
+                    except Exception as e:
+                        self.status_callback(
+                            f"  Batch fetch failed ({e}); fetching emails individually.",
+                            "warning"
+                        )
+                        message_details, skipped_ids = {}, set()
+                now = time.monotonic()
+                if i == 1 or i == new_count or now - last_progress_ts >= PROGRESS_STATUS_INTERVAL:
+                    self.status_callback(f"Checking email {i}/{new_count}...")
+                    last_progress_ts = now
+                if msg_id in skipped_ids:
                     self.status_callback(
                         "  Skipped: Gmail timestamp is outside the requested time window."
                     )
                     continue
-                payload = msg.get('payload', {})
 
-                # Get subject for logging
-                headers = {
-                    h['name']: h['value']
-                    for h in payload.get('headers', [])
-                }
-                subject = headers.get('Subject', '(no subject)')
-                from_header = headers.get('From', '')
-                message_text = _extract_message_context_text(payload, msg.get('snippet', ''))
-                sender_email = _extract_sender_email(from_header)
-                sender_header = from_header
-                (
-                    forwarded_sender_email,
-                    forwarded_sender_header,
-                    forwarded_subject,
-                ) = _extract_forwarded_message_metadata(
-                    payload,
-                    msg.get('snippet', ''),
-                )
-                if forwarded_sender_email:
-                    sender_email = forwarded_sender_email
-                    sender_header = forwarded_sender_header or sender_header
-                    self.status_callback(
-                        f"  Forwarded sender detected: {sender_email}"
-                    )
-                if forwarded_subject:
-                    subject = forwarded_subject
-
-                # Find attachments
-                parts = payload.get('parts', [])
-                attachments = self.find_attachments_in_parts(parts, msg_id)
-
-                # Also check top-level body (single-part messages)
-                if not parts and payload.get('filename') and payload.get('body', {}).get('attachmentId'):
-                    attachments.append({
-                        'filename': payload['filename'],
-                        'attachment_id': payload['body']['attachmentId'],
-                        'msg_id': msg_id,
-                        'mime_type': payload.get('mimeType', ''),
-                        'size': payload.get('body', {}).get('size', 0),
-                    })
-
-                if attachments:
-                    self.status_callback(
-                        f"  Email: \"{subject}\" - {len(attachments)} attachment(s)"
+                try:
+                    msg = message_details.pop(msg_id, None) or self.get_message_details(msg_id)
+                    if not _message_matches_time_filter(msg, message_time_filter):
+                        self.status_callback(
+                            "  Skipped: Gmail timestamp is outside the requested time window."
+                        )
+                        continue
+                    payload = msg.get('payload', {})
+
+                    # Get subject for logging
+                    headers = _select_headers(payload, ('Subject', 'From'))
+                    subject = headers.get('Subject', '(no subject)')
+                    from_header = headers.get('From', '')
+                    message_text = _extract_message_context_text(payload, msg.get('snippet', ''))
+                    sender_email = _extract_sender_email(from_header)
+                    sender_header = from_header
+                    (
+                        forwarded_sender_email,
+                        forwarded_sender_header,
+                        forwarded_subject,
+                    ) = _extract_forwarded_message_metadata(
+                        payload,
+                        msg.get('snippet', ''),
                     )
-                    download_completed = True
-                    for att in attachments:
-                        if self.should_stop():
-                            self.status_callback(
-                                "  Stop requested before email finished downloading; this email will remain untagged.",
-                                "warning",
-                            )
-                            download_completed = False
-                            break
-                        saved_name = self.download_attachment(
-                            msg_id, att['attachment_id'], att['filename']
+                    if forwarded_sender_email:
+                        sender_email = forwarded_sender_email
+                        sender_header = forwarded_sender_header or sender_header
+                        self.status_callback(
+                            f"  Forwarded sender detected: {sender_email}"
                         )
+                    if forwarded_subject:
+                        subject = forwarded_subject
+
+                    # Find attachments (the payload itself covers single-part messages)
+                    attachments = self.find_attachments_in_parts([payload], msg_id)
+                    skipped_attachments = 0
+                    if self.attachment_extensions:
+                        all_count = len(attachments)
+                        attachments = [
+                            att for att in attachments
+                            if att['filename'].lower().endswith(self.attachment_extensions)
+                        ]
+                        skipped_attachments = all_count - len(attachments)
+
+                    if attachments:
                         self.status_callback(
-                            f"    Downloaded: {saved_name}", "success"
+                            f"  Email: \"{subject}\" - {len(attachments)} attachment(s)"
                         )
-                        downloaded_attachments.append({
-                            'filename': saved_name,
-                            'sender_email': sender_email,
-                            'sender_header': sender_header,
-                            'subject': subject,
-                            'message_text': message_text,
-                            'message_id': msg_id,
+                        pending_downloads.append({
+                            'msg_id': msg_id,
+                            'futures': self._submit_attachment_downloads(
+                                download_pool, msg_id, attachments
+                            ),
+                            'entry': {
+                                'sender_email': sender_email,
+                                'sender_header': sender_header,
+                                'subject': subject,
+                                'message_text': message_text,
+                                'message_id': msg_id,
+                            },
                         })
-                    if download_completed:
-                        try:
-                            self._add_label_to_message(msg_id, self.processed_label_id)
-                        except Exception as label_err:
-                            self.status_callback(
-                                f"    Warning: couldn't add label: {label_err}", "warning"
-                            )
-                    else:
-                        break
-                elif _looks_like_sb_body_invoice(message_text, subject):
-                    self.status_callback(
-                        f"  Email: \"{subject}\" - S&B body invoice detected (no attachment)"
-                    )
-                    saved_name = self.save_body_invoice_source(
-                        parser='sb_shopify_order',
-                        msg_id=msg_id,
-                        subject=subject,
-                        sender_email=sender_email,
-                        sender_header=sender_header,
-                        message_text=message_text,
-                    )
-                    self.status_callback(
-                        f"    Saved body invoice source: {saved_name}", "success"
-                    )
-                    downloaded_attachments.append({
-                        'filename': saved_name,
-                        'sender_email': sender_email,
-                        'sender_header': sender_header,
-                        'subject': subject,
-                        'message_text': message_text,
-                        'message_id': msg_id,
-                        'email_body_invoice': True,
-                    })
-                    try:
-                        self._add_label_to_message(msg_id, self.processed_label_id)
-                    except Exception as label_err:
+                    elif _looks_like_sb_body_invoice(message_text, subject):
+                        self.status_callback(
+                            f"  Email: \"{subject}\" - S&B body invoice detected (no attachment)"
+                        )
+                        saved_name = self.save_body_invoice_source(
+                            parser='sb_shopify_order',
+                            msg_id=msg_id,
+                            subject=subject,
+                            sender_email=sender_email,
+                            sender_header=sender_header,
+                            message_text=message_text,
+                        )
+                        self.status_callback(
+                            f"    Saved body invoice source: {saved_name}", "success"
+                        )
+                        # Queued behind in-flight downloads so results stay in email order.
+                        pending_downloads.append({
+                            'msg_id': msg_id,
+                            'futures': [],
+                            'records': [{
+                                'filename': saved_name,
+                                'sender_email': sender_email,
+                                'sender_header': sender_header,
+                                'subject': subject,
+                                'message_text': message_text,
+                                'message_id': msg_id,
+                                'email_body_invoice': True,
+                            }],
+                        })
+                    elif skipped_attachments:
                         self.status_callback(
-                            f"    Warning: couldn't add label: {label_err}", "warning"
+                            f"  Email: \"{subject}\" - skipped {skipped_attachments} "
+                            "attachment(s) that are not invoice file types"
                         )
+                        pending_downloads.append({'msg_id': msg_id, 'futures': []})
 
-            except Exception as e:
-                self.status_callback(
-                    f"  Error processing email {msg_id}: {e}", "error"
-                )
+                except Exception as e:
+                    self.status_callback(
+                        f"  Error processing email {msg_id}: {e}", "error"
+                    )
+
+                # Keep a few emails' downloads in flight, finishing the oldest.
+                while len(pending_downloads) > self.download_workers:
+                    if not finish_oldest_download():
+                        stopped = True
+                if stopped:
+                    break
+            while pending_downloads:
+                finish_oldest_download()
+        finally:
+            prefetch_pool.shutdown(wait=False, cancel_futures=True)
+            if download_pool is not None:
+                download_pool.shutdown(wait=True, cancel_futures=True)
+            # Label processed emails in bulk, even if the loop raised.
+            self._flush_labels()
 
         self.status_callback(
             f"Download complete: {len(downloaded_attachments)} attachments from "
@@ -9,8 +9,15 @@ import os
 import sys
 import json
 import csv
+import io
 import re
+import hashlib
 import threading
+import traceback
+import multiprocessing
+from collections import Counter, OrderedDict, defaultdict, deque
+from contextlib import contextmanager
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
 import tkinter as tk
 from tkinter import messagebox, ttk
 import tkinter.font as tkfont
@@ -18,7 +25,10 @@ import time
 import ctypes
 import shutil
 import subprocess
-from datetime import datetime, timedelta, time as dt_time
+from datetime import date, datetime, timedelta, time as dt_time
+from functools import lru_cache
+from itertools import chain
+from operator import itemgetter
 from openpyxl import load_workbook
 from openpyxl.styles import PatternFill
 try:
@@ -35,18 +45,21 @@ except Exception:
 from gmail_client import (
     GmailClient,
     DriveHistoryClient,
+    INVOICE_ATTACHMENT_EXTENSIONS,
+    LEGACY_TOKEN_FILENAME,
     PROCESSED_LABEL_NAME,
+    TOKEN_FILENAME,
+    UNPROCESSED_QUERY,
     WrongAuthorizedAccountError
 )
 try:
     from core_detection import is_core_candidate
 except ImportError:
     from app.core_detection import is_core_candidate
-from invoice_parser import parse_email_invoice, parse_invoice, OCR_AVAILABLE
+from invoice_parser import parse_email_invoice, parse_invoice, OCR_AVAILABLE, VENDORS_CSV_PATH
 from spreadsheet_writer import (
     COLUMNS, write_invoice_to_spreadsheet, write_not_invoice_row,
-    read_spreadsheet_rows,
-    write_sku_updates,
+    get_or_create_workbook, iter_spreadsheet_rows, read_spreadsheet_rows,
     write_validation_result, write_validation_results, get_unique_po_numbers
 )
 from skunexus_client import SkuNexusClient, infer_invoice_row_sku_from_po, validate_po_row
@@ -69,6 +82,25 @@ BATCH_FOLDER_PREFIX = "Batch_"
 BATCHES_ROOT_NAME = "Batches"
 AUTHORIZED_GMAIL_ACCOUNT = "dppautoap@gmail.com"
 SHOPIFY_CORE_RATE_TOLERANCE = 0.01
+# Worker processes for invoice parsing (PDF text extraction and OCR are CPU-bound).
+# One core is left for the GUI; Tesseract threads internally as well.
+PARSE_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+# Parsed results reused for byte-identical files (e.g. forwarded re-sends).
+PARSED_CACHE_FILENAME = 'parsed_invoice_cache.json'
+PARSED_CACHE_MAX_ENTRIES = 2000
+# Concurrent SkuNexus PO lookups during validation (network-bound).
+SKUNEXUS_FETCH_WORKERS = 8
+# SkuNexus POs kept between files in one validation run (least recently used dropped first).
+PO_CACHE_MAX_ENTRIES = 512
+# Status-log lines and progress updates queued from worker threads are flushed
+# to the widgets about once per frame.
+LOG_FLUSH_INTERVAL_MS = 16
+# Oldest status-log lines are dropped beyond this so long runs keep redraws fast.
+LOG_MAX_LINES = 5000
+# Distinct header widths rendered during the shrink animation.
+HEADER_ANIMATION_FRAME_SIZES = 16
+# Shrink animation tick (~30 FPS); with 16 snapped widths faster ticks add nothing.
+HEADER_ANIMATION_TICK_MS = 33
 SENDER_METADATA_FIELDNAMES = [
     'source_file',
     'filename',
@@ -80,6 +112,23 @@ SENDER_METADATA_FIELDNAMES = [
     'downloaded_at',
 ]
 
+_ALIAS_SPLIT_RE = re.compile(r'[|;]')
+_NON_ALNUM_RE = re.compile(r'[^a-z0-9]+')
+_DATE_TAG_RE = re.compile(r'(?:invoices_output_|Invoices_Master_)(\d{1,2}-\d{1,2})')
+# Unicode-aware counterpart of str.isalnum(): \W plus underscore.
+_NON_UNICODE_ALNUM_RE = re.compile(r'[\W_]+')
+_ASCII_NON_ALNUM_DELETE_TABLE = str.maketrans(
+    '', '', ''.join(chr(c) for c in range(0x80) if not chr(c).isalnum())
+)
+# Explicit non-SKU labels / summary rows (compared after normalization).
+_NON_SKU_TOKENS = frozenset({
+    'core', 'ere', 'dppdiscount', 'discount',
+    'dropship', 'shipping', 'freight',
+    'totalamount', 'total', 'subtotal',
+})
+_DIGIT_DELETE_TABLE = str.maketrans('', '', '0123456789')
+_INVOICE_FILE_EXTENSIONS = frozenset(INVOICE_ATTACHMENT_EXTENSIONS)
+
 
 def _lookup_sender_metadata_entry(entries, source_file, filename=''):
     """Return sender metadata by exact source path first, then by filename fallback."""
@@ -146,6 +195,94 @@ def _load_sender_sidecar(filepath):
     }
 
 
+def _parsed_cache_key(filepath, sender_entry=None, app_version=''):
+    """Hash file content plus the filename, sender metadata and vendors.csv.
+
+    The parser reads the filename (statement detection, filename vendor hints)
+    and vendors.csv (vendor names, terms, addresses), so both are part of the
+    key. The app version is included so a parser update never serves stale
+    results.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    sender_entry = sender_entry or {}
+    try:
+        st = os.stat(VENDORS_CSV_PATH)
+        vendors_stat = [st.st_mtime_ns, st.st_size]
+    except OSError:
+        vendors_stat = [None, None]
+    context = [str(app_version), os.path.basename(filepath), VENDORS_CSV_PATH] + vendors_stat + [
+        str(sender_entry.get(key, '') or '')
+        for key in ('sender_email', 'sender_header', 'subject', 'message_text')
+    ]
+    digest.update(json.dumps(context).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _parse_invoice_file(filepath, sender_entry=None):
+    """Parse one invoice file, capturing log lines instead of writing to the GUI.
+
+    Runs in a parsing worker process, so results and logs must be picklable.
+
+    Returns:
+        tuple: (invoice_data or None, [(message, tag), ...], error text or None)
+    """
+    logs = []
+
+    def log(message, tag=None):
+        logs.append((message, tag))
+
+    sender_entry = sender_entry or {}
+    try:
+        if filepath.lower().endswith('.email.json'):
+            invoice_data = parse_email_invoice(filepath, log)
+        else:
+            invoice_data = parse_invoice(
+                filepath,
+                log,
+                sender_email=sender_entry.get('sender_email', ''),
+                sender_header=sender_entry.get('sender_header', ''),
+                sender_subject=sender_entry.get('subject', ''),
+                sender_message_text=sender_entry.get('message_text', ''),
+            )
+    except Exception as e:
+        return None, logs, str(e)
+    return invoice_data, logs, None
+
+
+def _is_invoice_filename(name):
+    """Return True for downloaded attachments and saved body-invoice sources."""
+    lower = name.lower()
+    dot = lower.rfind('.')
+    if dot >= 0 and lower[dot:] in _INVOICE_FILE_EXTENSIONS:
+        return True
+    return lower.endswith('.email.json')
+
+
+def _dir_entry_names(path):
+    """Return the (normcased) names in a directory, or an empty set if unreadable."""
+    try:
+        with os.scandir(path) as it:
+            return {os.path.normcase(entry.name) for entry in it}
+    except OSError:
+        return set()
+
+
+def _history_key(bill_no, po_number, vendor, invoice_date):
+    parts = (
+        str(bill_no or '').strip(),
+        str(po_number or '').strip(),
+        str(vendor or '').strip(),
+        str(invoice_date or '').strip(),
+    )
+    if not any(parts):
+        return ''
+    # '|' has no case, so lowering the joined key equals lowering each part.
+    return '|'.join(parts).lower()
+
+
 def _save_sender_sidecar(filepath, entry):
     """Persist sender metadata next to the downloaded invoice file."""
     path = _sender_sidecar_path(filepath)
@@ -156,13 +293,16 @@ def _save_sender_sidecar(filepath, entry):
     with open(path, 'w', encoding='utf-8') as f:
         json.dump(payload, f, indent=2)
 
+
+@lru_cache(maxsize=4096)
 def _normalize_vendor_key(name):
     if not name:
         return ''
     s = name.lower().strip()
     s = s.replace('&', 'and')
-    s = ''.join(ch for ch in s if ch.isalnum())
-    return s
+    if s.isascii():
+        return s.translate(_ASCII_NON_ALNUM_DELETE_TABLE)
+    return _NON_UNICODE_ALNUM_RE.sub('', s)
 
 
 def _cell_fill_rgb(cell):
@@ -192,7 +332,7 @@ def _should_preserve_duplicate_row_fill(cell):
 def _split_vendor_aliases(value):
     if not value:
         return []
-    parts = re.split(r'[|;]', str(value))
+    parts = _ALIAS_SPLIT_RE.split(str(value))
     return [p.strip() for p in parts if p.strip()]
 
 
@@ -207,51 +347,62 @@ def load_vendor_aliases(preferred_dir):
     if not path:
         return {}
     try:
-        with open(path, newline='', encoding='utf-8') as f:
-            rows = list(csv.reader(f))
+        return _read_vendor_aliases(path, os.path.getmtime(path))
     except Exception:
         return {}
-    if not rows:
-        return {}
-
-    header = [str(c).strip().lower() for c in rows[0]]
-    has_header = any(
-        h in ('vendor', 'invoice_vendor', 'aliases', 'alias', 'additional_names')
-        for h in header
-    )
-    if not has_header:
-        return {}
 
-    def col(row, *names):
-        for name in names:
-            if name in header:
-                idx = header.index(name)
-                if idx < len(row):
-                    return str(row[idx]).strip()
-        return ''
 
+@lru_cache(maxsize=8)
+def _read_vendor_aliases(path, mtime):
+    """Parse a vendors.csv file; cached per (path, mtime) so an unchanged file is read once."""
     aliases = {}
-    for row in rows[1:]:
-        if not row:
-            continue
-        vendor = col(row, 'vendor')
-        if not vendor:
-            continue
-        alias_value = col(row, 'aliases', 'alias', 'additional_names', 'invoice_vendor')
-        if not alias_value and 'skunexus_vendor' in header:
-            alias_value = col(row, 'skunexus_vendor')
-        alias_list = _split_vendor_aliases(alias_value)
-        if not alias_list:
-            continue
-        key = _normalize_vendor_key(vendor)
-        if not key:
-            continue
-        bucket = aliases.setdefault(key, [])
-        for alias in alias_list:
-            if alias and alias not in bucket:
-                bucket.append(alias)
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        if not reader.fieldnames:
+            return {}
+        reader.fieldnames = [str(c).strip().lower() for c in reader.fieldnames]
+        header = set(reader.fieldnames)
+        has_header = any(
+            h in header
+            for h in ('vendor', 'invoice_vendor', 'aliases', 'alias', 'additional_names')
+        )
+        if not has_header:
+            return {}
 
-    return aliases
+        # Resolve alias columns once; rows shorter than the header yield None.
+        alias_fields = [
+            name for name in ('aliases', 'alias', 'additional_names', 'invoice_vendor')
+            if name in header
+        ]
+        fallback_field = 'skunexus_vendor' if 'skunexus_vendor' in header else None
+
+        def col(row, fields):
+            for field in fields:
+                value = row.get(field)
+                if value is not None:
+                    return str(value).strip()
+            return ''
+
+        for row in reader:
+            vendor = str(row.get('vendor') or '').strip()
+            if not vendor:
+                continue
+            alias_value = col(row, alias_fields)
+            if not alias_value and fallback_field:
+                alias_value = str(row.get(fallback_field) or '').strip()
+            alias_list = _split_vendor_aliases(alias_value)
+            if not alias_list:
+                continue
+            key = _normalize_vendor_key(vendor)
+            if not key:
+                continue
+            # Dict keys keep first-seen order with O(1) duplicate checks.
+            bucket = aliases.setdefault(key, {})
+            for alias in alias_list:
+                if alias:
+                    bucket[alias] = None
+
+    return {key: list(bucket) for key, bucket in aliases.items()}
 
 
 def _get_status_messages(required_dir, ocr_available=OCR_AVAILABLE):
@@ -259,7 +410,10 @@ def _get_status_messages(required_dir, ocr_available=OCR_AVAILABLE):
         {'text': "Connected", 'foreground': 'green'},
     ]
     cred_exists = os.path.exists(os.path.join(required_dir, 'client_secret.json'))
-    token_exists = os.path.exists(os.path.join(required_dir, 'token.pickle'))
+    token_exists = any(
+        os.path.exists(os.path.join(required_dir, name))
+        for name in (TOKEN_FILENAME, LEGACY_TOKEN_FILENAME)
+    )
 
     if not cred_exists:
         messages.append({
@@ -285,34 +439,35 @@ def _get_status_messages(required_dir, ocr_available=OCR_AVAILABLE):
 def _looks_like_sku(value):
     if value is None:
         return False
-    raw = str(value).strip()
+    raw = (value if isinstance(value, str) else str(value)).strip()
     if not raw:
         return False
-    lower = raw.lower().strip()
+    return _looks_like_sku_text(raw)
+
+
+@lru_cache(maxsize=4096)
+def _looks_like_sku_text(raw):
+    # SKU strings repeat heavily across rows, so results are memoized per text.
+    lower = raw.lower()
     # Explicit non-SKU labels / summary rows
     if 'core' in lower:
         return False
-    normalized = re.sub(r'[^a-z0-9]+', '', lower)
-    if not normalized:
-        return False
-    if normalized in {
-        'core', 'ere', 'dppdiscount', 'discount',
-        'dropship', 'shipping', 'freight',
-        'totalamount', 'total', 'subtotal',
-    }:
+    normalized = _NON_ALNUM_RE.sub('', lower)
+    # Avoid very short tokens
+    if len(normalized) < 3 or normalized in _NON_SKU_TOKENS:
         return False
     # Require at least one digit to avoid matching plain words
-    if not any(ch.isdigit() for ch in normalized):
-        return False
-    # Avoid very short tokens
-    return len(normalized) >= 3
+    return normalized.translate(_DIGIT_DELETE_TABLE) != normalized
 
 
 def _get_row_sku(row):
-    sku = str(row.get('sku', '')).strip()
+    # Row values are almost always str already; skip the str() copy for those.
+    sku = row.get('sku', '')
+    sku = (sku if isinstance(sku, str) else str(sku)).strip()
     if sku:
         return sku
-    return str(row.get('product_service', '')).strip()
+    product = row.get('product_service', '')
+    return (product if isinstance(product, str) else str(product)).strip()
 
 
 def _to_float_value(value):
@@ -356,6 +511,50 @@ def _is_diamond_eye_zero_shipping_batch_row(row):
     return rate_value is not None and rate_value <= 0
 
 
+def _iter_invoice_groups(rows):
+    """Yield consecutive rows grouped per invoice (a new Bill No. starts a group)."""
+    current = []
+    current_bill = None
+    for row in rows:
+        bill_no = str(row.get('bill_no', '')).strip()
+        if bill_no:
+            if current and bill_no != current_bill:
+                yield current
+                current = []
+            current_bill = bill_no
+        if current_bill is None and not bill_no:
+            current_bill = ''
+        current.append(row)
+    if current:
+        yield current
+
+
+def _iter_row_batches(invoice_groups, row_limit=BATCH_ROW_LIMIT):
+    """Yield CSV batches of whole invoices holding at most row_limit rows.
+
+    An invoice larger than row_limit is yielded as a batch of its own.
+    """
+    current_batch = []
+    batch_rows = 0
+    for inv_rows in invoice_groups:
+        inv_count = len(inv_rows)
+        if batch_rows and (batch_rows + inv_count) > row_limit:
+            yield current_batch
+            current_batch = []
+            batch_rows = 0
+
+        if inv_count > row_limit and batch_rows == 0:
+            # Oversized invoice: put in its own batch
+            yield inv_rows
+            continue
+
+        current_batch.extend(inv_rows)
+        batch_rows += inv_count
+
+    if current_batch:
+        yield current_batch
+
+
 def _extract_related_order_numbers(sn_data):
     numbers = []
     seen = set()
@@ -396,6 +595,7 @@ def _is_core_row(row):
     return is_core_candidate(product_service, sku, description)
 
 
+@lru_cache(maxsize=None)
 def get_base_dir():
     """Get the base directory - works for both script and PyInstaller exe."""
     if getattr(sys, 'frozen', False):
@@ -406,15 +606,19 @@ def get_base_dir():
         return os.path.dirname(os.path.abspath(__file__))
 
 
+@lru_cache(maxsize=32)
 def get_resource_path(relative_path):
-    """Get path to bundled resource (works for PyInstaller onefile)."""
+    """Get path to bundled resource (works for PyInstaller onefile).
+
+    Cached: the frozen/_MEIPASS layout is fixed for the life of the process.
+    """
     if getattr(sys, 'frozen', False) and hasattr(sys, '_MEIPASS'):
         return os.path.join(sys._MEIPASS, relative_path)
     return os.path.join(os.path.dirname(os.path.abspath(__file__)), relative_path)
 
 
 def _extract_date_tag_from_filename(filename):
-    match = re.search(r'(?:invoices_output_|Invoices_Master_)(\d{1,2}-\d{1,2})', filename)
+    match = _DATE_TAG_RE.search(filename)
     if match:
         return match.group(1)
     return None
@@ -602,10 +806,20 @@ def _ensure_single_instance(window_title):
 class InvoiceExtractorGUI:
     def __init__(self, root):
         self.root = root
+        self._log_queue = deque()
+        self._log_queue_lock = threading.Lock()
+        self._log_drain_scheduled = False
+        self._pending_progress = 0
+        self._pending_progress_label = None
+        self._progress_flush_scheduled = False
         self.root.title("Invoice Extractor")
-        self._set_window_icon()
         self.root.geometry("750x680")
         self.root.resizable(True, True)
+        # header.png is decoded on a worker thread while the rest of startup
+        # runs; _init_header_source joins it before the PhotoImage is built.
+        self._header_decoded = None
+        self._header_decode_thread = None
+        self._start_header_decode()
 
         self.base_dir = get_base_dir()
         if getattr(sys, 'frozen', False):
@@ -632,6 +846,10 @@ class InvoiceExtractorGUI:
         self.output_file, self.invoices_dir = self._get_next_run_paths()
 
         self.is_running = False
+        # Parse worker processes are started on first use and kept across runs.
+        self._parse_pool = None
+        # ((mtime_ns, size) of invoice_history.csv, (by_po, by_bill, keys))
+        self._history_index_cache = None
         self.header_label = None
         self.header_image = None
         self.header_src_image = None
@@ -642,6 +860,7 @@ class InvoiceExtractorGUI:
         self.header_animating = False
         self.header_shrunken = False
         self._header_anim_token = None
+        self._header_frame_cache = {}
         self.header_base_left = 0
         self.last_batches_dir = None
         self._calendar_open = False
@@ -671,6 +890,9 @@ class InvoiceExtractorGUI:
         self.version_var = tk.StringVar(value=f"v{self.app_version}")
 
         self.build_ui()
+        # Icon loading and status file checks wait until the first paint.
+        self.root.after_idle(self._set_window_icon)
+        self.root.after_idle(self._populate_status)
         self.root.after(2000, self._check_for_updates_async)
 
     def _get_update_target_exe_path(self):
@@ -887,11 +1109,18 @@ class InvoiceExtractorGUI:
         if (not os.path.exists(output_path)) and (not os.path.exists(folder_path)):
             return output_path, folder_path
 
+        # Suffixes are taken: list both directories once and probe names in memory.
+        base_names = _dir_entry_names(self.base_dir)
+        invoice_names = _dir_entry_names(self.invoices_root)
         for i in range(2, 10000):
-            output_candidate = os.path.join(self.base_dir, f"{output_base}_{i}{ext}")
-            folder_candidate = os.path.join(self.invoices_root, f"{folder_base}_{i}")
-            if (not os.path.exists(output_candidate)) and (not os.path.exists(folder_candidate)):
-                return output_candidate, folder_candidate
+            output_name = f"{output_base}_{i}{ext}"
+            folder_name = f"{folder_base}_{i}"
+            if (os.path.normcase(output_name) not in base_names
+                    and os.path.normcase(folder_name) not in invoice_names):
+                return (
+                    os.path.join(self.base_dir, output_name),
+                    os.path.join(self.invoices_root, folder_name),
+                )
 
         # Fallback: use timestamp if we somehow hit a huge count
         stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -899,33 +1128,31 @@ class InvoiceExtractorGUI:
         folder_path = os.path.join(self.invoices_root, f"{folder_base}_{stamp}")
         return output_path, folder_path
 
+    def _list_output_workbooks(self, newest_first=False):
+        """Return output/master XLSX paths in base_dir sorted by modification time."""
+        entries = []
+        with os.scandir(self.base_dir) as it:
+            for entry in it:
+                name = entry.name
+                lower = name.lower()
+                if not lower.endswith('.xlsx'):
+                    continue
+                if not lower.startswith(('invoices_output', 'invoices_master_')):
+                    continue
+                if name.startswith('~$'):
+                    continue
+                entries.append((entry.stat().st_mtime, entry.path))
+        # DirEntry caches its stat result, so each file is stat'ed at most once.
+        entries.sort(key=lambda item: item[0], reverse=newest_first)
+        return [path for _, path in entries]
+
     def _get_output_files_for_validation(self):
         """Return all output XLSX files in base_dir (sorted oldest to newest)."""
-        files = []
-        for name in os.listdir(self.base_dir):
-            lower = name.lower()
-            if not lower.endswith('.xlsx'):
-                continue
-            if not (lower.startswith('invoices_output') or lower.startswith('invoices_master_')):
-                continue
-            files.append(os.path.join(self.base_dir, name))
-        files.sort(key=lambda p: os.path.getmtime(p))
-        return files
+        return self._list_output_workbooks()
 
     def _find_master_spreadsheets(self):
         """Return all master invoice XLSX files in base_dir (newest first)."""
-        files = []
-        for name in os.listdir(self.base_dir):
-            lower = name.lower()
-            if not lower.endswith('.xlsx'):
-                continue
-            if not (lower.startswith('invoices_output') or lower.startswith('invoices_master_')):
-                continue
-            if name.startswith('~$'):
-                continue
-            files.append(os.path.join(self.base_dir, name))
-        files.sort(key=lambda p: os.path.getmtime(p), reverse=True)
-        return files
+        return self._list_output_workbooks(newest_first=True)
 
     def _select_master_for_batching(self):
         """Pick the best master spreadsheet for batching (prefer today's date tag)."""
@@ -961,16 +1188,22 @@ class InvoiceExtractorGUI:
             'shopify_token.json',
             'invoice_history.csv',
         ]
-        # Do not auto-migrate token.pickle. If a user deletes it, they expect
+        # Do not auto-migrate the OAuth token. If a user deletes it, they expect
         # the next run to force a fresh OAuth login.
-        for name in files:
+        present = _dir_entry_names(self.required_dir)
+        missing = [name for name in files if os.path.normcase(name) not in present]
+        if not missing:
+            return
+        legacy_app_dir = os.path.join(self.base_dir, 'app')
+        source_dirs = [
+            (src_dir, _dir_entry_names(src_dir))
+            for src_dir in (self.app_dir, legacy_app_dir, self.base_dir)
+        ]
+        for name in missing:
             dest = os.path.join(self.required_dir, name)
-            if os.path.exists(dest):
-                continue
-            legacy_app_dir = os.path.join(self.base_dir, 'app')
-            for src_dir in (self.app_dir, legacy_app_dir, self.base_dir):
+            for src_dir, src_names in source_dirs:
                 src = os.path.join(src_dir, name)
-                if os.path.exists(src):
+                if os.path.normcase(name) in src_names:
                     try:
                         os.replace(src, dest)
                     except Exception:
@@ -1036,12 +1269,54 @@ class InvoiceExtractorGUI:
         except Exception as e:
             self.log(f"Warning: could not save sender metadata ({e})", "warning")
 
+    def _get_parse_pool(self):
+        """Return the shared parse process pool, starting it on first use."""
+        if self._parse_pool is None:
+            self._parse_pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS)
+        return self._parse_pool
+
+    def _shutdown_parse_pool(self):
+        """Stop the parse worker processes (app exit or after the pool broke)."""
+        pool, self._parse_pool = self._parse_pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _parsed_cache_path(self):
+        return os.path.join(self.required_dir, PARSED_CACHE_FILENAME)
+
+    def _load_parsed_cache(self):
+        """Load cached parse results keyed by _parsed_cache_key (oldest first)."""
+        path = self._parsed_cache_path()
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, encoding='utf-8') as f:
+                cache = json.load(f)
+            return cache if isinstance(cache, dict) else {}
+        except Exception as e:
+            self.log(f"Warning: could not read parsed invoice cache ({e})", "warning")
+            return {}
+
+    def _save_parsed_cache(self, cache):
+        """Persist the parse cache, dropping the oldest entries past the cap."""
+        keys = list(cache)
+        for key in keys[:max(0, len(keys) - PARSED_CACHE_MAX_ENTRIES)]:
+            del cache[key]
+        try:
+            with open(self._parsed_cache_path(), 'w', encoding='utf-8') as f:
+                json.dump(cache, f)
+        except Exception as e:
+            self.log(f"Warning: could not save parsed invoice cache ({e})", "warning")
+
     def _load_invoice_history(self, drive_client=None):
         """Load invoice history from Drive (preferred) or local fallback."""
         if drive_client is not None:
             rows = drive_client.download_rows()
             if rows:
-                self._save_local_history(rows)
+                if not self._save_local_history(rows):
+                    # The local copy no longer mirrors these rows, so its
+                    # stat can't vouch for the cached indexes.
+                    self._history_index_cache = None
                 return rows
         # Local fallback
         path = self._history_log_path()
@@ -1050,25 +1325,84 @@ class InvoiceExtractorGUI:
         rows = []
         try:
             with open(path, newline='', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
+                reader = csv.reader(f)
+                header = next(reader, None)
+                if not header:
+                    return []
+                # Columns are resolved once; short rows are padded the way
+                # DictReader would (missing fields read as '').
+                padding = ('',) * len(header)
                 for row in reader:
-                    rows.append({k: (v or '').strip() for k, v in row.items()})
+                    if not row:
+                        continue
+                    if len(row) < len(header):
+                        row = row + list(padding[len(row):])
+                    rows.append(dict(zip(header, map(str.strip, row))))
         except Exception as e:
             self.log(f"Warning: could not read invoice history ({e})", "warning")
         return rows
 
     def _save_local_history(self, rows):
-        """Write rows to local invoice_history.csv as a cache."""
+        """Write rows to local invoice_history.csv as a cache.
+
+        The file is left untouched when its contents already match, so its
+        stat stays valid for the history index cache. Returns False on error.
+        """
         from gmail_client import HISTORY_FIELDNAMES
         path = self._history_log_path()
+        buf = io.StringIO(newline='')
+        writer = csv.DictWriter(buf, fieldnames=HISTORY_FIELDNAMES)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({k: row.get(k, '') for k in HISTORY_FIELDNAMES})
+        data = buf.getvalue().encode('utf-8')
         try:
-            with open(path, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=HISTORY_FIELDNAMES)
-                writer.writeheader()
-                for row in rows:
-                    writer.writerow({k: row.get(k, '') for k in HISTORY_FIELDNAMES})
+            try:
+                with open(path, 'rb') as f:
+                    if f.read() == data:
+                        return True
+            except FileNotFoundError:
+                pass
+            with open(path, 'wb') as f:
+                f.write(data)
+            return True
         except Exception as e:
             self.log(f"Warning: could not cache invoice history locally ({e})", "warning")
+            return False
+
+    def _history_indexes(self, drive_client=None):
+        """Return (history_by_po, history_by_bill, history_keys) for duplicate checks.
+
+        The grouping is cached against the local history file's
+        (st_mtime_ns, st_size) and reused while that file is unchanged.
+        """
+        rows = self._load_invoice_history(drive_client=drive_client)
+        try:
+            st = os.stat(self._history_log_path())
+            stat_key = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            stat_key = None
+        cached = self._history_index_cache
+        if stat_key is not None and cached is not None and cached[0] == stat_key:
+            return cached[1]
+
+        history_by_po = defaultdict(list)
+        history_by_bill = defaultdict(list)
+        history_keys = set()
+        for row in rows:
+            get = row.get
+            po = str(get('po_number', '')).strip()
+            if po:
+                history_by_po[po].append(row)
+            bill_no = str(get('bill_no', '')).strip()
+            if bill_no:
+                history_by_bill[bill_no].append(row)
+            key = _history_key(bill_no, po, get('vendor', ''), get('invoice_date', ''))
+            if key:
+                history_keys.add(key)
+        result = (dict(history_by_po), dict(history_by_bill), history_keys)
+        self._history_index_cache = (stat_key, result) if stat_key is not None else None
+        return result
 
     def _append_invoice_history(self, entries, drive_client=None):
         """Append new entries to Drive history (preferred) and local fallback."""
@@ -1083,21 +1417,40 @@ class InvoiceExtractorGUI:
             self._save_local_history(existing)
             return
         # Local fallback
-        path = self._history_log_path()
-        file_exists = os.path.exists(path)
         try:
-            with open(path, 'a', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=HISTORY_FIELDNAMES)
-                if not file_exists:
-                    writer.writeheader()
-                for entry in entries:
-                    writer.writerow({k: entry.get(k, '') for k in HISTORY_FIELDNAMES})
+            with self._history_writer_context() as (writer, _f):
+                writer.writerows(
+                    [entry.get(k, '') for k in HISTORY_FIELDNAMES]
+                    for entry in entries
+                )
         except Exception as e:
             self.log(f"Warning: could not update invoice history ({e})", "warning")
 
-    def _apply_duplicate_flags(self, filepath, history_by_po, history_by_bill=None):
-        """Mark duplicates in output spreadsheet and return duplicate summary."""
-        if not os.path.exists(filepath):
+    @contextmanager
+    def _history_writer_context(self):
+        """Open the local history CSV once for appending a batch of rows.
+
+        Yields ``(writer, f)``; the header is written when the file is new and
+        the data is fsynced before closing.
+        """
+        from gmail_client import HISTORY_FIELDNAMES
+        path = self._history_log_path()
+        file_exists = os.path.exists(path)
+        with open(path, 'a', newline='', encoding='utf-8', buffering=8192) as f:
+            writer = csv.writer(f)
+            if not file_exists:
+                writer.writerow(HISTORY_FIELDNAMES)
+            yield writer, f
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _apply_duplicate_flags(self, filepath, history_by_po, history_by_bill=None, workbook=None):
+        """Mark duplicates in output spreadsheet and return duplicate summary.
+
+        With an already-open ``workbook`` the markers are applied in memory and
+        saving is left to the caller.
+        """
+        if workbook is None and not os.path.exists(filepath):
             return {'duplicate_invoices': 0, 'duplicate_rows': 0}
         if str(filepath).lower().endswith('.csv'):
             return {'duplicate_invoices': 0, 'duplicate_rows': 0}
@@ -1105,7 +1458,7 @@ class InvoiceExtractorGUI:
         history_by_po = history_by_po or {}
         history_by_bill = history_by_bill or {}
 
-        wb = load_workbook(filepath)
+        wb = workbook if workbook is not None else load_workbook(filepath)
         ws = wb.active
         if ws.max_row < 2:
             return {'duplicate_invoices': 0, 'duplicate_rows': 0}
@@ -1143,25 +1496,30 @@ class InvoiceExtractorGUI:
         # Build explicit invoice entries so duplicate Bill No. invoices remain separate.
         entries = []
         row_to_entry = {}
+        cells_by_row = {}
         current_entry_idx = None
         prev_bill = ''
 
-        for row_num in range(2, ws.max_row + 1):
+        # Walk the sheet once as cell tuples; the write pass below reuses them.
+        max_col = max(ws.max_column, dup_status_col, dup_ref_col, memo_col, mailing_col, terms_col, customer_col)
+        for row_cells in ws.iter_rows(min_row=2, max_row=ws.max_row, max_col=max_col):
             has_any_value = False
-            for col in range(1, ws.max_column + 1):
-                val = ws.cell(row=row_num, column=col).value
+            for cell in row_cells:
+                val = cell.value
                 if val is not None and str(val).strip():
                     has_any_value = True
                     break
             if not has_any_value:
                 continue
 
-            bill_cell = ws.cell(row=row_num, column=1)
+            bill_cell = row_cells[0]
+            row_num = bill_cell.row
+            cells_by_row[row_num] = row_cells
             bill_no = str(bill_cell.value or '').strip()
-            memo = str(ws.cell(row=row_num, column=memo_col).value or '').strip()
-            mailing = str(ws.cell(row=row_num, column=mailing_col).value or '').strip()
-            terms = str(ws.cell(row=row_num, column=terms_col).value or '').strip()
-            customer = str(ws.cell(row=row_num, column=customer_col).value or '').strip()
+            memo = str(row_cells[memo_col - 1].value or '').strip()
+            mailing = str(row_cells[mailing_col - 1].value or '').strip()
+            terms = str(row_cells[terms_col - 1].value or '').strip()
+            customer = str(row_cells[customer_col - 1].value or '').strip()
             has_link = bool(getattr(bill_cell, 'hyperlink', None))
 
             # First row of an invoice always has at least one header-like marker.
@@ -1245,6 +1603,30 @@ class InvoiceExtractorGUI:
                 return f"{bill} / {po_number}"
             return bill or po_number or ''
 
+        def _first_refs(refs, limit=5):
+            # Only the first few distinct references are shown, so stop there
+            # instead of building labels for every other duplicate.
+            picked = []
+            seen = set()
+            for ref in refs:
+                if ref and ref not in seen:
+                    picked.append(ref)
+                    seen.add(ref)
+                    if len(picked) >= limit:
+                        break
+            return picked
+
+        source_labels = [_short_source_label(entry.get('source_ref')) for entry in entries]
+        # History lists are shared by every entry with the same PO / Bill No.
+        history_refs_cache = {}
+
+        def _cached_history_refs(cache_key, hist_rows):
+            refs = history_refs_cache.get(cache_key)
+            if refs is None:
+                refs = _first_refs(_history_ref(hist) for hist in hist_rows)
+                history_refs_cache[cache_key] = refs
+            return refs
+
         for entry in entries:
             idx = entry['index']
             bill_no = entry.get('bill_no', '')
@@ -1256,57 +1638,44 @@ class InvoiceExtractorGUI:
             same_po_entries = po_to_entries.get(po, []) if po else []
             same_invoice_entries = []
             if bill_no and po:
+                same_po_set = set(same_po_entries)
                 same_invoice_entries = [
                     other_idx for other_idx in same_bill_entries
-                    if other_idx in set(same_po_entries)
+                    if other_idx in same_po_set
                 ]
 
             if len(same_invoice_entries) > 1:
                 status_parts.append("Duplicate Invoice (current file)")
-                current_refs = []
-                seen = set()
-                for other_idx in same_invoice_entries:
-                    if other_idx == idx:
-                        continue
-                    other = entries[other_idx]
-                    ref = _short_source_label(other.get('source_ref')) or (
-                        (other.get('bill_no') or '') + (f" / {other.get('po')}" if other.get('po') else '')
+                current_refs = _first_refs(
+                    source_labels[other_idx] or (
+                        (entries[other_idx].get('bill_no') or '')
+                        + (f" / {entries[other_idx].get('po')}" if entries[other_idx].get('po') else '')
                     ).strip()
-                    if ref and ref not in seen:
-                        current_refs.append(ref)
-                        seen.add(ref)
+                    for other_idx in same_invoice_entries
+                    if other_idx != idx
+                )
                 if current_refs:
-                    ref_parts.append("Current file: " + ", ".join(current_refs[:5]))
+                    ref_parts.append("Current file: " + ", ".join(current_refs))
             else:
                 if len(same_bill_entries) > 1:
                     status_parts.append("Duplicate Bill No. (current file)")
-                    current_refs = []
-                    seen = set()
-                    for other_idx in same_bill_entries:
-                        if other_idx == idx:
-                            continue
-                        other = entries[other_idx]
-                        ref = _short_source_label(other.get('source_ref')) or str(other.get('po') or '').strip()
-                        if ref and ref not in seen:
-                            current_refs.append(ref)
-                            seen.add(ref)
+                    current_refs = _first_refs(
+                        source_labels[other_idx] or str(entries[other_idx].get('po') or '').strip()
+                        for other_idx in same_bill_entries
+                        if other_idx != idx
+                    )
                     if current_refs:
-                        ref_parts.append("Current Bill No.: " + ", ".join(current_refs[:5]))
+                        ref_parts.append("Current Bill No.: " + ", ".join(current_refs))
 
                 if len(same_po_entries) > 1:
                     status_parts.append("Duplicate PO (current file)")
-                    current_refs = []
-                    seen = set()
-                    for other_idx in same_po_entries:
-                        if other_idx == idx:
-                            continue
-                        other = entries[other_idx]
-                        ref = _short_source_label(other.get('source_ref')) or str(other.get('bill_no') or '').strip()
-                        if ref and ref not in seen:
-                            current_refs.append(ref)
-                            seen.add(ref)
+                    current_refs = _first_refs(
+                        source_labels[other_idx] or str(entries[other_idx].get('bill_no') or '').strip()
+                        for other_idx in same_po_entries
+                        if other_idx != idx
+                    )
                     if current_refs:
-                        ref_parts.append("Current PO: " + ", ".join(current_refs[:5]))
+                        ref_parts.append("Current PO: " + ", ".join(current_refs))
 
             history_po_entries = history_by_po.get(po, []) if po else []
             history_bill_entries = history_by_bill.get(bill_no, []) if bill_no else []
@@ -1319,39 +1688,21 @@ class InvoiceExtractorGUI:
 
             if history_same_invoice:
                 status_parts.append("Duplicate Invoice (history)")
-                hist_refs = []
-                seen_refs = set()
-                for hist in history_same_invoice:
-                    ref = _history_ref(hist)
-                    if ref and ref not in seen_refs:
-                        hist_refs.append(ref)
-                        seen_refs.add(ref)
+                hist_refs = _cached_history_refs(('invoice', bill_no, po), history_same_invoice)
                 if hist_refs:
-                    ref_parts.append("History: " + ", ".join(hist_refs[:5]))
+                    ref_parts.append("History: " + ", ".join(hist_refs))
             else:
                 if history_po_entries:
                     status_parts.append("Duplicate PO (history)")
-                    hist_refs = []
-                    seen_refs = set()
-                    for hist in history_po_entries:
-                        ref = _history_ref(hist)
-                        if ref and ref not in seen_refs:
-                            hist_refs.append(ref)
-                            seen_refs.add(ref)
+                    hist_refs = _cached_history_refs(('po', po), history_po_entries)
                     if hist_refs:
-                        ref_parts.append("History PO: " + ", ".join(hist_refs[:5]))
+                        ref_parts.append("History PO: " + ", ".join(hist_refs))
 
                 if history_bill_entries:
                     status_parts.append("Duplicate Bill No. (history)")
-                    hist_refs = []
-                    seen_refs = set()
-                    for hist in history_bill_entries:
-                        ref = _history_ref(hist)
-                        if ref and ref not in seen_refs:
-                            hist_refs.append(ref)
-                            seen_refs.add(ref)
+                    hist_refs = _cached_history_refs(('bill', bill_no), history_bill_entries)
                     if hist_refs:
-                        ref_parts.append("History Bill No.: " + ", ".join(hist_refs[:5]))
+                        ref_parts.append("History Bill No.: " + ", ".join(hist_refs))
 
             if status_parts:
                 unique_status = []
@@ -1372,41 +1723,47 @@ class InvoiceExtractorGUI:
         dup_entry_indices = set(status_by_entry.keys())
         dup_fill_light = PatternFill(start_color="A8A8A8", end_color="A8A8A8", fill_type='solid')
         dup_fill_dark = PatternFill(start_color="888888", end_color="888888", fill_type='solid')
+        row_fill_cache = {}  # (start_rgb, end_rgb) -> PatternFill
 
-        for row_num in range(2, ws.max_row + 1):
-            entry_idx = row_to_entry.get(row_num)
-            if entry_idx is None:
-                continue
-
+        for row_num, row_cells in cells_by_row.items():
+            entry_idx = row_to_entry[row_num]
             entry = entries[entry_idx]
             is_first = entry.get('start_row') == row_num
             status = status_by_entry.get(entry_idx)
+            status_cell = row_cells[dup_status_col - 1]
+            ref_cell = row_cells[dup_ref_col - 1]
             if is_first and status:
-                ws.cell(row=row_num, column=dup_status_col, value=status)
-                ws.cell(row=row_num, column=dup_ref_col, value=ref_by_entry.get(entry_idx, ''))
+                status_cell.value = status
+                ref_cell.value = ref_by_entry.get(entry_idx, '')
             else:
-                ws.cell(row=row_num, column=dup_status_col, value='')
-                ws.cell(row=row_num, column=dup_ref_col, value='')
+                status_cell.value = ''
+                ref_cell.value = ''
 
             # Match row fill for duplicate columns first.
-            first_cell = ws.cell(row=row_num, column=1)
+            first_cell = row_cells[0]
+            first_fill = first_cell.fill
             preserve_row_fill = _should_preserve_duplicate_row_fill(first_cell)
-            if first_cell.fill and first_cell.fill.patternType == 'solid':
-                row_fill = PatternFill(
-                    start_color=first_cell.fill.start_color.rgb,
-                    end_color=first_cell.fill.end_color.rgb,
-                    fill_type='solid'
-                )
-                ws.cell(row=row_num, column=dup_status_col).fill = row_fill
-                ws.cell(row=row_num, column=dup_ref_col).fill = row_fill
+            if first_fill and first_fill.patternType == 'solid':
+                fill_key = (first_fill.start_color.rgb, first_fill.end_color.rgb)
+                row_fill = row_fill_cache.get(fill_key)
+                if row_fill is None:
+                    row_fill = PatternFill(
+                        start_color=fill_key[0],
+                        end_color=fill_key[1],
+                        fill_type='solid'
+                    )
+                    row_fill_cache[fill_key] = row_fill
+                status_cell.fill = row_fill
+                ref_cell.fill = row_fill
 
             # Override only neutral rows; preserve semantic fills like stock-order purple.
             if entry_idx in dup_entry_indices and not preserve_row_fill:
                 dup_fill = dup_fill_dark if (entry_idx % 2 == 0) else dup_fill_light
-                for col in range(1, ws.max_column + 1):
-                    ws.cell(row=row_num, column=col).fill = dup_fill
+                for cell in row_cells:
+                    cell.fill = dup_fill
 
-        wb.save(filepath)
+        if workbook is None:
+            wb.save(filepath)
 
         duplicate_rows = sum(len(entries[idx]['rows']) for idx in dup_entry_indices)
         return {
@@ -1424,6 +1781,16 @@ class InvoiceExtractorGUI:
             validate_state = tk.NORMAL if outputs else tk.DISABLED
             self.validate_button.config(state=validate_state)
 
+    def _populate_status(self):
+        """Replace the status placeholder with credential/token/OCR messages."""
+        frame = getattr(self, 'status_messages_frame', None)
+        if not frame:
+            return
+        for child in frame.winfo_children():
+            child.destroy()
+        for label_kwargs in _get_status_messages(self.required_dir):
+            ttk.Label(frame, **label_kwargs).pack(anchor=tk.W)
+
     def _set_window_icon(self):
         """Set the window/taskbar icon (Tk default is the leaf)."""
         try:
@@ -1658,12 +2025,23 @@ class InvoiceExtractorGUI:
     def _parse_date_input(self, value):
         if not value:
             return None
-        for fmt in ("%Y/%m/%d", "%Y-%m-%d", "%m/%d/%Y"):
+        # Zero-padded YYYY-MM-DD / YYYY/MM/DD: the C ISO parser is much cheaper
+        # than strptime. Anything it rejects still goes through strptime below.
+        if len(value) == 10 and value[4] == value[7] and value[4] in '/-':
             try:
-                return datetime.strptime(value, fmt).date()
+                return date.fromisoformat(value.replace('/', '-'))
             except ValueError:
-                continue
-        return None
+                pass
+        # Pick the one format that can match: year-first inputs start with four
+        # digits and a separator (%Y needs exactly four), the rest are US-style.
+        if len(value) > 4 and value[:4].isdigit() and value[4] in '/-':
+            fmt = "%Y/%m/%d" if value[4] == '/' else "%Y-%m-%d"
+        else:
+            fmt = "%m/%d/%Y"
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            return None
 
     def _build_gmail_query(self):
         """Build Gmail search query based on date filter options."""
@@ -1728,7 +2106,7 @@ class InvoiceExtractorGUI:
                 return None, None, None
             return query, "range", message_time_filter
 
-        return f"-label:{PROCESSED_LABEL_NAME}", "label", message_time_filter
+        return UNPROCESSED_QUERY, "label", message_time_filter
 
     def _update_date_filter_state(self):
         enabled = self.date_filter_var.get()
@@ -1851,10 +2229,14 @@ class InvoiceExtractorGUI:
             bg = style.lookup('TFrame', 'background') or self.root.cget('bg')
             fg = style.lookup('TLabel', 'foreground') or 'black'
             canvas = tk.Canvas(parent, highlightthickness=0, bd=0, bg=bg)
+            # Tk has no letter-spacing, so glyphs are placed individually; measure
+            # each distinct character once and skip items for blanks.
+            char_widths = {ch: font_obj.measure(ch) for ch in set(text)}
             x = 0
             for ch in text:
-                canvas.create_text(x, 0, text=ch, font=font_obj, anchor='nw', fill=fg)
-                x += font_obj.measure(ch) + spacing_px
+                if not ch.isspace():
+                    canvas.create_text(x, 0, text=ch, font=font_obj, anchor='nw', fill=fg)
+                x += char_widths[ch] + spacing_px
             width = max(1, x - spacing_px)
             height = font_obj.metrics('linespace')
             canvas.configure(width=width, height=height)
@@ -1873,9 +2255,10 @@ class InvoiceExtractorGUI:
         info_frame = ttk.LabelFrame(main_frame, text="Status", padding=8)
         info_frame.pack(fill=tk.X, pady=(0, 10))
 
-        # Credential status
-        for label_kwargs in _get_status_messages(self.required_dir):
-            ttk.Label(info_frame, **label_kwargs).pack(anchor=tk.W)
+        # Credential status (filled in by _populate_status once the window is up)
+        self.status_messages_frame = ttk.Frame(info_frame)
+        self.status_messages_frame.pack(fill=tk.X)
+        ttk.Label(self.status_messages_frame, text="Checking...").pack(anchor=tk.W)
 
         # Date filter frame (inside Status)
         filter_frame = ttk.LabelFrame(info_frame, text="Filter Invoices by Date (Optional)", padding=8)
@@ -2143,11 +2526,35 @@ class InvoiceExtractorGUI:
         self.log_text.tag_configure('info', foreground='#5599ff')
         self._ensure_log_min_height(200)
 
+    def _start_header_decode(self):
+        """Decode header.png in the background (PIL only; Tk images stay on the UI thread)."""
+        path = get_resource_path('header.png')
+        if not PIL_AVAILABLE or not os.path.exists(path):
+            return
+
+        def _decode():
+            try:
+                img = Image.open(path)
+                img.load()
+                self._header_decoded = (path, img)
+            except Exception:
+                pass
+
+        self._header_decode_thread = threading.Thread(target=_decode, daemon=True)
+        self._header_decode_thread.start()
+
     def _init_header_source(self):
         if self.header_src_image is not None or not self.header_path or not os.path.exists(self.header_path):
             return
+        thread, self._header_decode_thread = self._header_decode_thread, None
+        if thread is not None:
+            thread.join()
+        decoded, self._header_decoded = self._header_decoded, None
         try:
-            if PIL_AVAILABLE:
+            if decoded is not None and decoded[0] == self.header_path:
+                self.header_src_image = decoded[1]
+                self.header_src_width = self.header_src_image.width
+            elif PIL_AVAILABLE:
                 self.header_src_image = Image.open(self.header_path)
                 self.header_src_width = self.header_src_image.width
             else:
@@ -2157,7 +2564,7 @@ class InvoiceExtractorGUI:
             self.header_src_image = None
             self.header_src_width = None
 
-    def _load_header_image(self, target_width):
+    def _load_header_image(self, target_width, high_quality=True):
         self._init_header_source()
         if self.header_src_image is None or not self.header_src_width:
             return None
@@ -2175,7 +2582,9 @@ class InvoiceExtractorGUI:
                     max(1, int(round(img.width * scale))),
                     max(1, int(round(img.height * scale)))
                 )
-                img = img.resize(new_size, Image.LANCZOS)
+                # Bilinear keeps animation frames cheap; the resting frame gets Lanczos.
+                resample = Image.LANCZOS if high_quality else Image.BILINEAR
+                img = img.resize(new_size, resample)
             return ImageTk.PhotoImage(img)
 
         img = self.header_src_image
@@ -2185,10 +2594,10 @@ class InvoiceExtractorGUI:
         num = max(1, int(round(scale * denom)))
         return img.zoom(num, num).subsample(denom, denom)
 
-    def _update_header_width(self, target_width):
+    def _update_header_width(self, target_width, high_quality=True):
         if not self.header_label:
             return
-        img = self._load_header_image(target_width)
+        img = self._load_header_image(target_width, high_quality=high_quality)
         if not img:
             return
         self.header_image = img
@@ -2231,6 +2640,13 @@ class InvoiceExtractorGUI:
 
         self.header_animating = True
         duration_ms = 1750
+        # Snap intermediate frames to a few precomputed widths so each size is
+        # resampled once; the final frame is rendered at the exact target width.
+        frame_widths = [
+            int(round(start_width + (target_width - start_width) * i / (HEADER_ANIMATION_FRAME_SIZES - 1)))
+            for i in range(HEADER_ANIMATION_FRAME_SIZES)
+        ]
+        self._header_frame_cache = {}
         start_time = time.perf_counter()
         token = object()
         self._header_anim_token = token
@@ -2242,10 +2658,22 @@ class InvoiceExtractorGUI:
             t = min(1.0, elapsed_ms / duration_ms)
             eased = self._ease_in_out_cubic(t)
             width = int(round(start_width + (target_width - start_width) * eased))
-            self._update_header_width(max(1, width))
             if t < 1.0:
-                self.root.after(16, step)
+                width = min(frame_widths, key=lambda w: abs(w - width))
+                # Consecutive ticks often snap to the same width; skip the relayout.
+                if width != self.header_current_width:
+                    img = self._header_frame_cache.get(width)
+                    if img is None:
+                        img = self._load_header_image(max(1, width), high_quality=False)
+                        self._header_frame_cache[width] = img
+                    if img:
+                        self.header_image = img
+                        self.header_label.configure(image=img)
+                        self.header_current_width = width
+                self.root.after(HEADER_ANIMATION_TICK_MS, step)
             else:
+                self._update_header_width(max(1, width))
+                self._header_frame_cache = {}
                 self.header_animating = False
                 self.header_shrunken = True
                 self.header_current_width = width
@@ -2254,26 +2682,60 @@ class InvoiceExtractorGUI:
 
     def log(self, message, tag=None):
         """Add a message to the status log (thread-safe)."""
-        def _update():
-            self.log_text.config(state=tk.NORMAL)
-            timestamp = datetime.now().strftime('%H:%M:%S')
-            line = f"[{timestamp}] {message}\n"
-            if tag:
-                self.log_text.insert(tk.END, line, tag)
-            else:
-                self.log_text.insert(tk.END, line)
-            self.log_text.see(tk.END)
-            self.log_text.config(state=tk.DISABLED)
-
-        self.root.after(0, _update)
+        timestamp = datetime.now().strftime('%H:%M:%S')
+        with self._log_queue_lock:
+            self._log_queue.append((f"[{timestamp}] {message}\n", tag))
+            if self._log_drain_scheduled:
+                return
+            self._log_drain_scheduled = True
+        # One Tk callback per frame flushes every line queued since the last one.
+        self.root.after(LOG_FLUSH_INTERVAL_MS, self._drain_log_queue)
+
+    def _drain_log_queue(self):
+        """Insert all queued log lines into the status log in one widget update."""
+        with self._log_queue_lock:
+            entries = list(self._log_queue)
+            self._log_queue.clear()
+            self._log_drain_scheduled = False
+        if not entries:
+            return
+        log_text = self.log_text
+        end = tk.END
+        # Text.insert accepts alternating chars/tags pairs, so the whole batch
+        # goes to Tcl in one call; '' is an empty tag list.
+        chunks = []
+        append = chunks.append
+        for line, tag in entries:
+            append(line)
+            append(tag or '')
+        log_text.config(state=tk.NORMAL)
+        log_text.insert(end, *chunks)
+        log_text.delete('1.0', f'end-{LOG_MAX_LINES + 1}l')
+        log_text.see(end)
+        log_text.config(state=tk.DISABLED)
 
     def set_progress(self, value, label_text=None):
         """Update progress bar and label (thread-safe)."""
-        def _update():
-            self.progress_var.set(value)
+        with self._log_queue_lock:
+            self._pending_progress = value
             if label_text:
-                self.progress_label.config(text=label_text)
-        self.root.after(0, _update)
+                self._pending_progress_label = label_text
+            if self._progress_flush_scheduled:
+                return
+            self._progress_flush_scheduled = True
+        # Per-row updates arriving within one frame collapse to the latest value.
+        self.root.after(LOG_FLUSH_INTERVAL_MS, self._apply_pending_progress)
+
+    def _apply_pending_progress(self):
+        """Apply the most recent progress value and label queued by set_progress."""
+        with self._log_queue_lock:
+            value = self._pending_progress
+            label_text = self._pending_progress_label
+            self._pending_progress_label = None
+            self._progress_flush_scheduled = False
+        self.progress_var.set(value)
+        if label_text:
+            self.progress_label.config(text=label_text)
 
     def start_processing(self):
         """Start the full extraction pipeline in a background thread."""
@@ -2369,36 +2831,9 @@ class InvoiceExtractorGUI:
             self.log("", None)
             self.log("=== Phase 2: Parsing invoice files ===", "info")
 
-            def _history_key(bill_no, po_number, vendor, invoice_date):
-                parts = [
-                    str(bill_no or '').strip(),
-                    str(po_number or '').strip(),
-                    str(vendor or '').strip(),
-                    str(invoice_date or '').strip(),
-                ]
-                if not any(parts):
-                    return ''
-                return '|'.join([p.lower() for p in parts])
-
-            history_rows = self._load_invoice_history(drive_client=drive_client)
-            history_by_po = {}
-            history_by_bill = {}
-            history_keys = set()
-            for row in history_rows:
-                po = str(row.get('po_number', '')).strip()
-                if po:
-                    history_by_po.setdefault(po, []).append(row)
-                bill_no_hist = str(row.get('bill_no', '')).strip()
-                if bill_no_hist:
-                    history_by_bill.setdefault(bill_no_hist, []).append(row)
-                key = _history_key(
-                    row.get('bill_no', ''),
-                    po,
-                    row.get('vendor', ''),
-                    row.get('invoice_date', '')
-                )
-                if key:
-                    history_keys.add(key)
+            history_by_po, history_by_bill, history_keys = self._history_indexes(
+                drive_client=drive_client
+            )
 
             new_history_entries = []
             new_history_keys = set()
@@ -2447,10 +2882,12 @@ class InvoiceExtractorGUI:
             # Find all invoice files to parse
             all_invoice_files = []
             if os.path.exists(self.invoices_dir):
-                for f in os.listdir(self.invoices_dir):
-                    if f.lower().endswith(('.pdf', '.png', '.jpg', '.jpeg', '.tiff', '.email.json')):
-                        all_invoice_files.append(f)
+                with os.scandir(self.invoices_dir) as entries:
+                    for entry in entries:
+                        if entry.is_file() and _is_invoice_filename(entry.name):
+                            all_invoice_files.append(entry.name)
 
+            finish_message = "Processing complete!"
             if not all_invoice_files:
                 self.log("No invoice files to parse.", "success")
             else:
@@ -2459,113 +2896,246 @@ class InvoiceExtractorGUI:
                 success_count = 0
                 error_count = 0
                 error_files = []
-
-                for i, filename in enumerate(all_invoice_files):
-                    if not self.is_running:
-                        self.finish("Stopped by user.")
-                        return
-
-                    progress = 40 + (50 * (i + 1) / len(all_invoice_files))
-                    self.set_progress(
-                        progress,
-                        f"Parsing invoice {i + 1}/{len(all_invoice_files)}..."
-                    )
-
+                written_files = []
+
+                # Resolve sender metadata up front, then parse in worker processes.
+                # Results are consumed in file order so spreadsheet rows and log
+                # output match a sequential run.
+                parsed_cache = self._load_parsed_cache()
+                parsed_cache_updated = False
+                parse_jobs = []
+                for filename in all_invoice_files:
                     filepath = os.path.join(self.invoices_dir, filename)
-                    self.log(f"Processing: {filename}")
-
+                    job = {
+                        'filename': filename,
+                        'filepath': filepath,
+                        'source_path': _source_file(filename),
+                        'sender_entry': {},
+                        'logs': [],
+                        'error': None,
+                    }
+                    parse_jobs.append(job)
                     try:
-                        source_path = _source_file(filename)
                         sender_entry = _merge_sender_metadata_entries(
                             _load_sender_sidecar(filepath),
                             _lookup_sender_metadata_entry(
                                 sender_metadata,
-                                source_path,
+                                job['source_path'],
                                 filename,
                             ),
                         )
+                        job['sender_entry'] = sender_entry
                         if sender_entry:
                             try:
                                 existing_sidecar = _load_sender_sidecar(filepath)
                                 if sender_entry != existing_sidecar:
                                     _save_sender_sidecar(filepath, sender_entry)
                             except Exception as e:
-                                self.log(
+                                job['logs'].append((
                                     f"  Warning: could not refresh sender sidecar for {filename} ({e})",
                                     "warning",
-                                )
+                                ))
                         if sender_entry:
                             sender_ref = str(sender_entry.get('sender_email', '')).strip() or str(
                                 sender_entry.get('sender_header', '')
                             ).strip()
                             if sender_ref:
-                                self.log(f"  Sender metadata: {sender_ref}")
+                                job['logs'].append((f"  Sender metadata: {sender_ref}", None))
                         else:
-                            self.log(
+                            job['logs'].append((
                                 f"  No sender metadata found for {filename}; vendor detection will rely on invoice content.",
                                 "warning",
-                            )
-                        if filename.lower().endswith('.email.json'):
-                            invoice_data = parse_email_invoice(filepath, self.log)
-                        else:
-                            invoice_data = parse_invoice(
-                                filepath,
-                                self.log,
-                                sender_email=sender_entry.get('sender_email', ''),
-                                sender_header=sender_entry.get('sender_header', ''),
-                                sender_subject=sender_entry.get('subject', ''),
-                                sender_message_text=sender_entry.get('message_text', ''),
-                            )
+                            ))
+                        job['cache_key'] = _parsed_cache_key(
+                            filepath, sender_entry, self.app_version
+                        )
+                        if job['cache_key'] in parsed_cache:
+                            # Re-insert so the entry counts as recently used.
+                            job['cached'] = parsed_cache.pop(job['cache_key'])
+                            parsed_cache[job['cache_key']] = job['cached']
+                            parsed_cache_updated = True
+                    except Exception as e:
+                        job['error'] = str(e)
 
-                        if invoice_data and invoice_data.get('not_an_invoice'):
-                            write_not_invoice_row(self.output_file, source_path, self.log)
-                            success_count += 1
-                        elif invoice_data:
-                            invoice_data['source_path'] = source_path
-                            write_invoice_to_spreadsheet(
-                                self.output_file, invoice_data, self.log
-                            )
-                            success_count += 1
-                            bill_no = str(invoice_data.get('invoice_number', '')).strip()
-                            po_number = str(invoice_data.get('po_number', '')).strip()
-                            vendor = str(invoice_data.get('vendor', '')).strip()
-                            invoice_date = str(invoice_data.get('date', '')).strip()
-                            key = _history_key(bill_no, po_number, vendor, invoice_date)
-                            if key and key not in history_keys and key not in new_history_keys:
-                                new_history_entries.append({
-                                    'bill_no': bill_no,
-                                    'po_number': po_number,
-                                    'vendor': vendor,
-                                    'invoice_date': invoice_date,
-                                    'downloaded_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                                    'source_file': _source_file(filename),
-                                })
-                                new_history_keys.add(key)
-                        else:
+                parse_pool = None
+                parse_pool_broken = False
+                if PARSE_WORKERS > 1 and len(parse_jobs) > 1:
+                    try:
+                        parse_pool = self._get_parse_pool()
+                        for job in parse_jobs:
+                            if job['error'] is None and 'cached' not in job:
+                                job['future'] = parse_pool.submit(
+                                    _parse_invoice_file, job['filepath'], job['sender_entry']
+                                )
+                    except Exception as e:
+                        self.log(
+                            f"Parallel parsing unavailable ({e}); parsing in this process.",
+                            "warning",
+                        )
+                        for job in parse_jobs:
+                            future = job.pop('future', None)
+                            if future is not None:
+                                future.cancel()
+                        self._shutdown_parse_pool()
+                        parse_pool = None
+
+                # Bound once for the per-file loop below.
+                log = self.log
+                set_progress = self.set_progress
+                total_jobs = len(parse_jobs)
+                # The output workbook is opened on the first write and saved once
+                # after the loop instead of a load/save round trip per invoice.
+                output_wb = None
+                workbook_saved = True
+                dup_summary = None
+                try:
+                    for i, job in enumerate(parse_jobs):
+                        if not self.is_running:
+                            self.finish("Stopped by user.")
+                            return
+
+                        filename = job['filename']
+                        progress = 40 + (50 * (i + 1) / total_jobs)
+                        set_progress(
+                            progress,
+                            f"Parsing invoice {i + 1}/{total_jobs}..."
+                        )
+                        log(f"Processing: {filename}")
+                        for message, tag in job['logs']:
+                            log(message, tag)
+
+                        try:
+                            if job['error'] is not None:
+                                raise RuntimeError(job['error'])
+                            future = job.get('future')
+                            if 'cached' in job:
+                                result = (
+                                    json.loads(json.dumps(job['cached'])),
+                                    [("  Reused parse result from an identical earlier file.", None)],
+                                    None,
+                                )
+                            elif future is None:
+                                result = _parse_invoice_file(job['filepath'], job['sender_entry'])
+                            else:
+                                try:
+                                    result = future.result()
+                                except Exception as e:
+                                    # Worker crashed or pool broke; parse here instead.
+                                    if isinstance(e, BrokenExecutor):
+                                        parse_pool_broken = True
+                                    log(f"  Parse worker failed ({e}); retrying in this process.", "warning")
+                                    result = _parse_invoice_file(job['filepath'], job['sender_entry'])
+                            invoice_data, parse_logs, parse_error = result
+                            for message, tag in parse_logs:
+                                log(message, tag)
+                            if parse_error is not None:
+                                raise RuntimeError(parse_error)
+                            if invoice_data and job.get('cache_key') and 'cached' not in job:
+                                try:
+                                    parsed_cache[job['cache_key']] = json.loads(json.dumps(invoice_data))
+                                    parsed_cache_updated = True
+                                except (TypeError, ValueError):
+                                    pass
+
+                            source_path = job['source_path']
+                            if invoice_data and output_wb is None:
+                                output_wb, _ = get_or_create_workbook(self.output_file)
+                            if invoice_data and invoice_data.get('not_an_invoice'):
+                                write_not_invoice_row(
+                                    self.output_file, source_path, log, workbook=output_wb
+                                )
+                                success_count += 1
+                                written_files.append(filename)
+                            elif invoice_data:
+                                invoice_data['source_path'] = source_path
+                                write_invoice_to_spreadsheet(
+                                    self.output_file, invoice_data, log, workbook=output_wb
+                                )
+                                success_count += 1
+                                written_files.append(filename)
+                                bill_no = str(invoice_data.get('invoice_number', '')).strip()
+                                po_number = str(invoice_data.get('po_number', '')).strip()
+                                vendor = str(invoice_data.get('vendor', '')).strip()
+                                invoice_date = str(invoice_data.get('date', '')).strip()
+                                key = _history_key(bill_no, po_number, vendor, invoice_date)
+                                if key and key not in history_keys and key not in new_history_keys:
+                                    new_history_entries.append({
+                                        'bill_no': bill_no,
+                                        'po_number': po_number,
+                                        'vendor': vendor,
+                                        'invoice_date': invoice_date,
+                                        'downloaded_at': timestamp_now,
+                                        'source_file': source_path,
+                                    })
+                                    new_history_keys.add(key)
+                            else:
+                                error_count += 1
+                                error_files.append(filename)
+
+                        except Exception as e:
+                            log(f"  Failed to parse {filename}: {e}", "error")
                             error_count += 1
                             error_files.append(filename)
 
-                    except Exception as e:
-                        self.log(f"  Failed to parse {filename}: {e}", "error")
-                        error_count += 1
-                        error_files.append(filename)
-
-                # Apply duplicate markers and update history log
-                if os.path.exists(self.output_file):
-                    dup_summary = self._apply_duplicate_flags(
-                        self.output_file,
-                        history_by_po,
-                        history_by_bill
-                    )
-                    dup_invoices = int((dup_summary or {}).get('duplicate_invoices', 0))
-                    dup_rows = int((dup_summary or {}).get('duplicate_rows', 0))
-                    if dup_invoices:
+                    # Apply duplicate markers to the open workbook; the finally
+                    # below saves the rows and the markers in one write, so the
+                    # summary is only reported once that save succeeds.
+                    if output_wb is not None or os.path.exists(self.output_file):
+                        dup_summary = self._apply_duplicate_flags(
+                            self.output_file,
+                            history_by_po,
+                            history_by_bill,
+                            workbook=output_wb,
+                        ) or {}
+                finally:
+                    if output_wb is not None:
+                        try:
+                            output_wb.save(self.output_file)
+                        except Exception as e:
+                            workbook_saved = False
+                            self.log(
+                                f"Failed to save {os.path.basename(self.output_file)}: {e}",
+                                "error",
+                            )
+                    if parse_pool is not None:
+                        # Keep the warm pool for the next run; just drop this run's
+                        # queued work (e.g. after Stop). A broken pool is replaced.
+                        for job in parse_jobs:
+                            future = job.get('future')
+                            if future is not None:
+                                future.cancel()
+                        if parse_pool_broken:
+                            self._shutdown_parse_pool()
+                    if parsed_cache_updated:
+                        self._save_parsed_cache(parsed_cache)
+
+                if dup_summary is not None:
+                    dup_invoices = int(dup_summary.get('duplicate_invoices', 0))
+                    dup_rows = int(dup_summary.get('duplicate_rows', 0))
+                    if not workbook_saved:
+                        if dup_invoices:
+                            self.log(
+                                f"Duplicate invoice flags not written: {dup_invoices} invoice(s), {dup_rows} row(s).",
+                                "error"
+                            )
+                    elif dup_invoices:
                         self.log(
                             f"Duplicate invoices flagged: {dup_invoices} invoice(s), {dup_rows} row(s).",
                             "warning"
                         )
                     else:
                         self.log("Duplicate invoices flagged: 0.")
+
+                if not workbook_saved:
+                    # None of this run's rows reached the spreadsheet; keep them out
+                    # of history so the next run extracts them again.
+                    error_count += success_count
+                    error_files.extend(written_files)
+                    success_count = 0
+                    new_history_entries = []
+                    finish_message = "Failed - could not save output workbook."
+
+                # Update history log
                 if new_history_entries:
                     self._append_invoice_history(new_history_entries, drive_client=drive_client)
 
@@ -2580,7 +3150,7 @@ class InvoiceExtractorGUI:
                     for ef in error_files:
                         self.log(f"  - {ef}", "error")
 
-            self.finish("Processing complete!")
+            self.finish(finish_message)
 
         except FileNotFoundError as e:
             self.log(f"File not found: {e}", "error")
@@ -2641,8 +3211,10 @@ class InvoiceExtractorGUI:
                 "warning"
             )
 
-        raw_rows = read_spreadsheet_rows(master_path)
-        if not raw_rows:
+        # Streamed straight from the read-only workbook into the batch generators.
+        raw_rows = iter_spreadsheet_rows(master_path)
+        first_row = next(raw_rows, None)
+        if first_row is None:
             self.log("Master spreadsheet has no data rows.", "warning")
             return
 
@@ -2657,68 +3229,41 @@ class InvoiceExtractorGUI:
                 and str(row.get('rate', '')).strip() == ''
             )
 
-        rows = [r for r in raw_rows if not _is_total_amount_summary_row(r)]
-        dropped_summary_rows = len(raw_rows) - len(rows)
-        if dropped_summary_rows:
-            self.log(
-                f"Removed {dropped_summary_rows} Total Amount summary row(s) from CSV batches.",
-                "info"
-            )
+        # Rows are filtered, grouped and batched lazily; only the batch being
+        # written and the next one (for file naming) are held at a time.
+        dropped = {'summary': 0, 'diamond_eye_shipping': 0}
 
-        filtered_rows = [r for r in rows if not _is_diamond_eye_zero_shipping_batch_row(r)]
-        dropped_diamond_eye_shipping_rows = len(rows) - len(filtered_rows)
-        rows = filtered_rows
-        if dropped_diamond_eye_shipping_rows:
-            self.log(
-                "Removed "
-                f"{dropped_diamond_eye_shipping_rows} Diamond Eye zero-shipping row(s) "
-                "from CSV batches.",
-                "info"
-            )
+        def _exportable_rows():
+            for row in chain((first_row,), raw_rows):
+                if _is_total_amount_summary_row(row):
+                    dropped['summary'] += 1
+                elif _is_diamond_eye_zero_shipping_batch_row(row):
+                    dropped['diamond_eye_shipping'] += 1
+                else:
+                    yield row
 
-        if not rows:
+        def _log_dropped_rows():
+            if dropped['summary']:
+                self.log(
+                    f"Removed {dropped['summary']} Total Amount summary row(s) from CSV batches.",
+                    "info"
+                )
+            if dropped['diamond_eye_shipping']:
+                self.log(
+                    "Removed "
+                    f"{dropped['diamond_eye_shipping']} Diamond Eye zero-shipping row(s) "
+                    "from CSV batches.",
+                    "info"
+                )
+
+        # Group rows by invoice (keep invoices intact) and batch without splitting invoices
+        batches = _iter_row_batches(_iter_invoice_groups(_exportable_rows()))
+        pending = next(batches, None)
+        if pending is None:
+            _log_dropped_rows()
             self.log("No exportable rows after removing summary rows.", "warning")
             return
 
-        # Group rows by invoice (keep invoices intact)
-        invoices = []
-        current = []
-        current_bill = None
-        for row in rows:
-            bill_no = str(row.get('bill_no', '')).strip()
-            if bill_no:
-                if current and bill_no != current_bill:
-                    invoices.append(current)
-                    current = []
-                current_bill = bill_no
-            if current_bill is None and not bill_no:
-                current_bill = ''
-            current.append(row)
-        if current:
-            invoices.append(current)
-
-        # Build batches without splitting invoices
-        batches = []
-        batch_rows = 0
-        current_batch = []
-        for inv_rows in invoices:
-            inv_count = len(inv_rows)
-            if batch_rows and (batch_rows + inv_count) > BATCH_ROW_LIMIT:
-                batches.append(current_batch)
-                current_batch = []
-                batch_rows = 0
-
-            if inv_count > BATCH_ROW_LIMIT and batch_rows == 0:
-                # Oversized invoice: put in its own batch
-                batches.append(inv_rows)
-                continue
-
-            current_batch.extend(inv_rows)
-            batch_rows += inv_count
-
-        if current_batch:
-            batches.append(current_batch)
-
         date_tag = _extract_date_tag_from_filename(os.path.basename(master_path))
         if not date_tag:
             date_tag = f"{datetime.now().month}-{datetime.now().day}"
@@ -2728,29 +3273,40 @@ class InvoiceExtractorGUI:
         self.last_batches_dir = batches_dir
 
         headers = [header for _, header in COLUMNS]
-        for idx, batch in enumerate(batches, start=1):
-            if len(batches) == 1:
+        # iter_spreadsheet_rows fills every COLUMNS key, so values come out in
+        # column order with one C-level lookup per row.
+        row_values = itemgetter(*[key for key, _ in COLUMNS])
+        batch_count = 0
+        oversized = 0
+        while pending is not None:
+            upcoming = next(batches, None)
+            batch_count += 1
+            if batch_count == 1 and upcoming is None:
                 filename = f"{BATCH_FOLDER_PREFIX}{date_tag}.csv"
             else:
-                filename = f"{BATCH_FOLDER_PREFIX}{date_tag}_{idx}.csv"
+                filename = f"{BATCH_FOLDER_PREFIX}{date_tag}_{batch_count}.csv"
             out_path = os.path.join(batches_dir, filename)
             with open(out_path, 'w', newline='', encoding='utf-8') as f:
                 writer = csv.writer(f)
                 writer.writerow(headers)
-                for row in batch:
-                    writer.writerow([row.get(key, '') for key, _ in COLUMNS])
+                writer.writerows(map(row_values, pending))
+            # Only a lone oversized invoice can push a batch past the limit.
+            if len(pending) > BATCH_ROW_LIMIT:
+                oversized += 1
+            pending = upcoming
+
+        _log_dropped_rows()
 
         # Warn if any invoice exceeded the batch limit
-        oversized = [len(inv) for inv in invoices if len(inv) > BATCH_ROW_LIMIT]
         if oversized:
             self.log(
-                f"Warning: {len(oversized)} invoice(s) exceeded the batch limit "
+                f"Warning: {oversized} invoice(s) exceeded the batch limit "
                 f"({BATCH_ROW_LIMIT} rows) and were exported alone.",
                 "warning"
             )
 
         self.log(
-            f"Exported {len(batches)} batch file(s) to {os.path.basename(batches_dir)}",
+            f"Exported {batch_count} batch file(s) to {os.path.basename(batches_dir)}",
             "success"
         )
         self._refresh_batch_buttons()
@@ -2919,6 +3475,7 @@ class InvoiceExtractorGUI:
 
     def run_validation_pipeline(self):
         """Validate POs against SkuNexus - runs in background thread."""
+        po_pool = None
         try:
             self.log("=== SkuNexus PO Validation ===", "info")
 
@@ -2933,8 +3490,9 @@ class InvoiceExtractorGUI:
                 self.finish_validation("Validation failed - missing config file")
                 return
 
-            with open(config_path, 'r') as f:
-                skunexus_config = json.load(f)
+            # Bytes let json detect UTF-8 (with or without BOM) itself.
+            with open(config_path, 'rb') as f:
+                skunexus_config = json.loads(f.read())
 
             skunexus_email = skunexus_config.get('email', '')
             skunexus_password = skunexus_config.get('password', '')
@@ -2973,8 +3531,8 @@ class InvoiceExtractorGUI:
                 return
 
             try:
-                with open(shopify_config_path, 'r', encoding='utf-8-sig') as f:
-                    shopify_config = json.load(f)
+                with open(shopify_config_path, 'rb') as f:
+                    shopify_config = json.loads(f.read())
             except Exception as e:
                 self.log(f"ERROR: Could not read shopify_config.json: {e}", "error")
                 self.finish_validation("Validation failed - invalid Shopify config")
@@ -3100,142 +3658,189 @@ class InvoiceExtractorGUI:
             skipped_count = 0
             already_validated_count = 0
             locked_files_count = 0
-            po_cache = {}  # Cache SkuNexus data + margin by PO number
+            po_cache = OrderedDict()  # Cache SkuNexus data + margin by PO number (LRU)
 
             processed_rows = 0
 
             def _pick_vendor(vendors):
-                if not vendors:
-                    return ''
-                counts = {}
-                for v in vendors:
-                    counts[v] = counts.get(v, 0) + 1
-                return max(counts, key=counts.get)
+                # Ties resolve to the vendor seen first, as most_common(1) keeps insertion order.
+                return Counter(vendors).most_common(1)[0][0] if vendors else ''
+
+            def _fetch_po(memo, vendor_hint, sku_hints):
+                """Fetch SkuNexus PO data for a memo; log lines are returned, not emitted."""
+                logs = []
+                # Extract PO number without "PO" prefix
+                po_number = memo[2:] if memo.upper().startswith('PO') else memo
+
+                logs.append((f"Fetching PO {po_number} from SkuNexus...", None))
+                sn_data, error = client.get_best_po_with_line_items(
+                    po_number,
+                    invoice_vendor=vendor_hint,
+                    invoice_skus=sku_hints,
+                    vendor_aliases=vendor_aliases
+                )
 
+                if error:
+                    logs.append((f"  Could not find PO {po_number}: {error}", "warning"))
+                    return {
+                        'sn_data': None,
+                        'margin': None,
+                        'related_order_numbers': [],
+                    }, logs
+
+                margin_value, margin_error = client.get_po_margin(sn_data, po_number)
+                if margin_error:
+                    logs.append((f"  Margin unavailable for PO {po_number}: {margin_error}", "warning"))
+                else:
+                    logs.append((f"  PO margin: {margin_value:.4f}", None))
+                related_order_numbers = _extract_related_order_numbers(sn_data)
+                if related_order_numbers:
+                    logs.append((
+                        "  Related order number(s): "
+                        f"{', '.join(related_order_numbers)}",
+                        None,
+                    ))
+                else:
+                    logs.append(("  No related order number found in SkuNexus", "warning"))
+                logs.append((
+                    f"  Found PO with {len(sn_data.get('lineItems', {}).get('rows', []))} line items",
+                    None,
+                ))
+                return {
+                    'sn_data': sn_data,
+                    'margin': margin_value,
+                    'related_order_numbers': related_order_numbers,
+                }, logs
+
+            # PO lookups are network-bound, so each file's POs are requested
+            # concurrently up front; the row loop below consumes them in order.
+            po_futures = {}
+            if SKUNEXUS_FETCH_WORKERS > 1:
+                po_pool = ThreadPoolExecutor(max_workers=SKUNEXUS_FETCH_WORKERS)
+
+            set_progress = self.set_progress
             for filepath, rows in files_info:
                 if not self.is_running:
                     self.finish_validation("Stopped by user.")
                     return
 
+                # Trim only between files: Shopify CORE checks read every PO of the
+                # current file from the cache after its row loop.
+                while len(po_cache) > PO_CACHE_MAX_ENTRIES:
+                    po_cache.popitem(last=False)
+
                 basename = os.path.basename(filepath)
                 self.log("")
                 self.log(f"--- Validating {basename} ---", "info")
 
-                # Map Bill No. -> Memo (PO) so we can validate item rows that omit Memo
+                # Map Bill No. -> Memo (PO) so we can validate item rows that omit Memo,
+                # reading each row's fields once for the PO grouping below.
                 memo_by_bill = {}
+                row_fields = []
                 for row in rows:
                     bill_no = str(row.get('bill_no', '')).strip()
                     memo = str(row.get('memo', '')).strip()
                     if bill_no and memo:
                         memo_by_bill[bill_no] = memo
-
-                # Group rows by PO number (collect vendor/SKU hints)
-                po_groups = {}
-                for row in rows:
-                    memo = str(row.get('memo', '')).strip()
+                    sku = _get_row_sku(row)
+                    row_fields.append((
+                        row,
+                        memo,
+                        bill_no,
+                        str(row.get('vendor', '')).strip(),
+                        sku if _looks_like_sku(sku) else '',
+                    ))
+
+                # Group rows by PO number (collect vendor/SKU hints) as
+                # parallel (rows, vendors, skus) lists per PO. Memo-less rows
+                # resolve through the completed Bill No. map, so row order is kept.
+                po_groups = defaultdict(lambda: ([], [], []))
+                resolved_rows = []
+                for row, memo, bill_no, vendor, sku in row_fields:
                     if not memo:
-                        bill_no = str(row.get('bill_no', '')).strip()
                         memo = str(memo_by_bill.get(bill_no, '')).strip()
+                    resolved_rows.append((row, memo, bill_no, vendor, sku))
                     if not memo:
                         continue
-                    group = po_groups.setdefault(memo, {'rows': [], 'vendors': [], 'skus': []})
-                    group['rows'].append(row)
-                    vendor = str(row.get('vendor', '')).strip()
+                    group_rows, group_vendors, group_skus = po_groups[memo]
+                    group_rows.append(row)
                     if vendor:
-                        group['vendors'].append(vendor)
-                    sku = _get_row_sku(row)
-                    if _looks_like_sku(sku):
-                        group['skus'].append(sku)
+                        group_vendors.append(vendor)
+                    if sku:
+                        group_skus.append(sku)
+
+                # Per-PO vendor hints, computed once rather than for every row.
+                group_vendor_by_memo = {
+                    memo: _pick_vendor(group_vendors)
+                    for memo, (_, group_vendors, _) in po_groups.items()
+                }
+                sb_group_memos = {
+                    memo for memo, vendor in group_vendor_by_memo.items()
+                    if _is_sb_vendor_name(vendor)
+                }
+
+                # Prefetch every PO the row loop will look up (same filter it applies).
+                if po_pool is not None:
+                    for row, memo, bill_no, vendor, sku in resolved_rows:
+                        if not memo or memo in po_cache or memo in po_futures:
+                            continue
+                        if row.get('category', '') != 'Purchases':
+                            continue
+                        if not sku and not (_is_sb_vendor_name(vendor) or memo in sb_group_memos):
+                            continue
+                        po_futures[memo] = po_pool.submit(
+                            _fetch_po,
+                            memo,
+                            group_vendor_by_memo[memo],
+                            po_groups[memo][2],
+                        )
 
                 updates = {}
                 margin_updates = {}
                 sku_updates = {}
                 first_margin_row_by_group = {}
                 used_line_items_by_memo = {}
-                for row in rows:
+                for row, memo, bill_no, row_vendor, sku_value in resolved_rows:
                     if not self.is_running:
                         self.finish_validation("Stopped by user.")
                         return
 
                     processed_rows += 1
                     progress = 15 + (80 * (processed_rows / total_rows))
-                    self.set_progress(progress, f"Validating row {processed_rows}/{total_rows}...")
+                    set_progress(progress, f"Validating row {processed_rows}/{total_rows}...")
 
                     row_num = row['_row_num']
-                    bill_no = str(row.get('bill_no', '')).strip()
-
-                    existing_validation = str(row.get('skunexus_validation', '')).strip()
-
-                    memo = str(row.get('memo', '')).strip()
-                    if not memo:
-                        bill_no = str(row.get('bill_no', '')).strip()
-                        memo = str(memo_by_bill.get(bill_no, '')).strip()
-                    category = row.get('category', '')
-
-                    # Skip rows without PO number
-                    if not memo:
-                        skipped_count += 1
-                        continue
-
-                    # Only validate SKU rows (Category/Account = Purchases)
-                    if category != 'Purchases':
-                        skipped_count += 1
-                        continue
 
-                    sku_value = _get_row_sku(row)
-                    row_vendor = str(row.get('vendor', '')).strip()
-                    group_vendor = _pick_vendor((po_groups.get(memo, {}) or {}).get('vendors', []))
+                    # Only validate SKU rows (Category/Account = Purchases) that have a
+                    # PO number. sku_value is already blank unless it looks like a SKU;
+                    # S&B rows without one can still have it inferred from the PO.
                     can_infer_missing_sku = (
-                        not _looks_like_sku(sku_value)
-                        and (_is_sb_vendor_name(row_vendor) or _is_sb_vendor_name(group_vendor))
+                        not sku_value
+                        and (_is_sb_vendor_name(row_vendor) or memo in sb_group_memos)
                     )
-                    if not _looks_like_sku(sku_value) and not can_infer_missing_sku:
+                    if (
+                        not memo
+                        or row.get('category', '') != 'Purchases'
+                        or not (sku_value or can_infer_missing_sku)
+                    ):
                         skipped_count += 1
                         continue
 
-                    # Get SkuNexus data (from cache or fetch)
-                    if memo not in po_cache:
-                        # Extract PO number without "PO" prefix
-                        po_number = memo[2:] if memo.upper().startswith('PO') else memo
-
-                        self.log(f"Fetching PO {po_number} from SkuNexus...")
-                        group = po_groups.get(memo, {})
-                        vendor_hint = _pick_vendor(group.get('vendors', []))
-                        sku_hints = group.get('skus', [])
-                        sn_data, error = client.get_best_po_with_line_items(
-                            po_number,
-                            invoice_vendor=vendor_hint,
-                            invoice_skus=sku_hints,
-                            vendor_aliases=vendor_aliases
-                        )
+                    existing_validation = str(row.get('skunexus_validation', '')).strip()
 
-                        if error:
-                            self.log(f"  Could not find PO {po_number}: {error}", "warning")
-                            po_cache[memo] = {
-                                'sn_data': None,
-                                'margin': None,
-                                'related_order_numbers': [],
-                            }
+                    # Get SkuNexus data (from cache, prefetch or fetch)
+                    if memo not in po_cache:
+                        future = po_futures.pop(memo, None)
+                        if future is not None:
+                            po_cache[memo], fetch_logs = future.result()
                         else:
-                            margin_value, margin_error = client.get_po_margin(sn_data, po_number)
-                            if margin_error:
-                                self.log(f"  Margin unavailable for PO {po_number}: {margin_error}", "warning")
-                            else:
-                                self.log(f"  PO margin: {margin_value:.4f}")
-                            related_order_numbers = _extract_related_order_numbers(sn_data)
-                            if related_order_numbers:
-                                self.log(
-                                    "  Related order number(s): "
-                                    f"{', '.join(related_order_numbers)}"
-                                )
-                            else:
-                                self.log("  No related order number found in SkuNexus", "warning")
-                            po_cache[memo] = {
-                                'sn_data': sn_data,
-                                'margin': margin_value,
-                                'related_order_numbers': related_order_numbers,
-                            }
-                            self.log(f"  Found PO with {len(sn_data.get('lineItems', {}).get('rows', []))} line items")
+                            po_cache[memo], fetch_logs = _fetch_po(
+                                memo, group_vendor_by_memo[memo], po_groups[memo][2]
+                            )
+                        for message, tag in fetch_logs:
+                            self.log(message, tag)
+                    else:
+                        po_cache.move_to_end(memo)
 
                     cache_entry = po_cache.get(memo, {})
                     sn_data = cache_entry.get('sn_data')
@@ -3261,7 +3866,7 @@ class InvoiceExtractorGUI:
                         not_found_count += 1
                         continue
 
-                    if not _looks_like_sku(sku_value):
+                    if not sku_value:
                         if can_infer_missing_sku:
                             used_line_item_ids = used_line_items_by_memo.setdefault(memo, set())
                             inferred_sku, matched_line_id = infer_invoice_row_sku_from_po(
@@ -3309,13 +3914,12 @@ class InvoiceExtractorGUI:
 
                 if updates or margin_updates or shopify_core_updates or sku_updates:
                     try:
-                        if sku_updates:
-                            write_sku_updates(filepath, sku_updates)
                         write_validation_results(
                             filepath,
                             updates,
                             margin_updates,
-                            shopify_core_updates
+                            shopify_core_updates,
+                            sku_updates=sku_updates,
                         )
                         self.log(
                             f"Updated {len(updates)} validation row(s) and "
@@ -3368,9 +3972,11 @@ class InvoiceExtractorGUI:
 
         except Exception as e:
             self.log(f"Validation error: {e}", "error")
-            import traceback
             self.log(traceback.format_exc(), "error")
             self.finish_validation("Validation failed with error.")
+        finally:
+            if po_pool is not None:
+                po_pool.shutdown(wait=False, cancel_futures=True)
 
     def finish_validation(self, message):
         """Reset UI state after validation completes."""
@@ -3394,17 +4000,22 @@ def main():
     # Try to use a modern theme
     try:
         style = ttk.Style()
-        available_themes = style.theme_names()
-        if 'vista' in available_themes:
-            style.theme_use('vista')
-        elif 'clam' in available_themes:
-            style.theme_use('clam')
+        available_themes = set(style.theme_names())
+        for theme in ('vista', 'clam'):
+            if theme in available_themes:
+                style.theme_use(theme)
+                break
     except Exception:
         pass
 
     app = InvoiceExtractorGUI(root)
-    root.mainloop()
+    try:
+        root.mainloop()
+    finally:
+        app._shutdown_parse_pool()
 
 
 if __name__ == '__main__':
+    # Required for the parsing worker processes in the frozen Windows build.
+    multiprocessing.freeze_support()
     main()
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 """SkuNexus API client for PO validation."""
 from difflib import SequenceMatcher
+from functools import lru_cache
 import re
 import requests
 
@@ -505,7 +506,9 @@ def _group_item_maps_to_po(grouped_item, target_po_norm):
     return False
 
 
+@lru_cache(maxsize=1024)
 def _normalize_vendor_key(name):
+    # Vendor names repeat on every row and every SKU comparison; memoized.
     if not name:
         return ''
     s = name.lower().strip()
@@ -777,16 +780,19 @@ def validate_po_row(skunexus_data, invoice_row, vendor_aliases=None):
     if invoice_vendor:
         candidates = [invoice_vendor] + _get_vendor_aliases(invoice_vendor, vendor_aliases)
         vendor_ok = False
+        sn_vendor_lower = sn_vendor.lower()
+        sn_vendor_key = sn_vendor_lower.replace('&', 'and')
+        sn_vendor_is_sb = 's&b' in sn_vendor_lower or 's & b' in sn_vendor_lower
         for candidate in candidates:
             if not candidate:
                 continue
-            invoice_vendor_lower = candidate.lower().replace('&', 'and')
-            sn_vendor_lower = sn_vendor.lower().replace('&', 'and')
-            if invoice_vendor_lower in sn_vendor_lower or sn_vendor_lower in invoice_vendor_lower:
+            candidate_lower = candidate.lower()
+            invoice_vendor_lower = candidate_lower.replace('&', 'and')
+            if invoice_vendor_lower in sn_vendor_key or sn_vendor_key in invoice_vendor_lower:
                 vendor_ok = True
                 break
-            if 's&b' in candidate.lower() or 's & b' in candidate.lower():
-                if 's&b' in sn_vendor.lower() or 's & b' in sn_vendor.lower():
+            if 's&b' in candidate_lower or 's & b' in candidate_lower:
+                if sn_vendor_is_sb:
                     vendor_ok = True
                     break
         if not vendor_ok:
@@ -794,12 +800,12 @@ def validate_po_row(skunexus_data, invoice_row, vendor_aliases=None):
 
     # Find matching line item by SKU
     matching_item = None
+    # Normalize SKUs for comparison (remove separators; vendor-specific tweaks)
+    invoice_sku_norm = _normalize_sku(invoice_sku, invoice_vendor)
     for item in sn_line_items:
         product = item.get('product', {})
         sn_sku = product.get('sku', '')
 
-        # Normalize SKUs for comparison (remove separators; vendor-specific tweaks)
-        invoice_sku_norm = _normalize_sku(invoice_sku, invoice_vendor)
         sn_sku_norm = _normalize_sku(sn_sku, invoice_vendor)
 
         if invoice_sku_norm == sn_sku_norm or invoice_sku_norm in sn_sku_norm or sn_sku_norm in invoice_sku_norm:
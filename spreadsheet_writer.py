@@ -357,7 +357,7 @@ def count_existing_invoice_groups(ws):
     return count
 
 
-def write_invoice_rows(filepath, invoice_data, status_callback=None):
+def write_invoice_rows(filepath, invoice_data, status_callback=None, workbook=None):
     """Write invoice data as multiple rows (one per line item + shipping).
 
     Format matches QuickBooks Bill Import:
@@ -369,6 +369,8 @@ def write_invoice_rows(filepath, invoice_data, status_callback=None):
         filepath: Path to the .xlsx file
         invoice_data: Dict with parsed invoice fields including 'line_items' list
         status_callback: Optional function(msg, tag) for status updates
+        workbook: Optional already-open Workbook for filepath (from
+            get_or_create_workbook); rows are added to it and the caller saves
 
     Returns:
         int: Number of rows written
@@ -385,7 +387,10 @@ def write_invoice_rows(filepath, invoice_data, status_callback=None):
     if is_csv:
         csv_file, csv_writer = _get_csv_writer(filepath)
     else:
-        wb, ws = get_or_create_workbook(filepath)
+        if workbook is not None:
+            wb, ws = workbook, workbook.active
+        else:
+            wb, ws = get_or_create_workbook(filepath)
         # Count existing invoice groups to determine if this invoice should be colored
         # Even-indexed invoices (0, 2, 4...) get no color, odd-indexed (1, 3, 5...) get gray
         invoice_index = count_existing_invoice_groups(ws)
@@ -776,7 +781,7 @@ def write_invoice_rows(filepath, invoice_data, status_callback=None):
     if is_csv:
         if csv_file:
             csv_file.close()
-    else:
+    elif workbook is None:
         wb.save(filepath)
     cb(f"  Written {rows_written} row(s) to spreadsheet for invoice {bill_no}", "success")
 
@@ -784,18 +789,25 @@ def write_invoice_rows(filepath, invoice_data, status_callback=None):
 
 
 # Keep old function for backwards compatibility but redirect to new one
-def write_invoice_to_spreadsheet(filepath, invoice_data, status_callback=None):
+def write_invoice_to_spreadsheet(filepath, invoice_data, status_callback=None, workbook=None):
     """Append invoice data to spreadsheet (wrapper for write_invoice_rows)."""
-    return write_invoice_rows(filepath, invoice_data, status_callback)
+    return write_invoice_rows(filepath, invoice_data, status_callback, workbook=workbook)
 
 
-def write_not_invoice_row(filepath, source_path, status_callback=None):
-    """Write a single red 'Not an Invoice' row for a file that failed the invoice check."""
+def write_not_invoice_row(filepath, source_path, status_callback=None, workbook=None):
+    """Write a single red 'Not an Invoice' row for a file that failed the invoice check.
+
+    Like write_invoice_rows, an open ``workbook`` is updated in place and left
+    for the caller to save.
+    """
     is_csv = _is_csv(filepath)
     if is_csv:
         return
 
-    wb, ws = get_or_create_workbook(filepath)
+    if workbook is not None:
+        wb, ws = workbook, workbook.active
+    else:
+        wb, ws = get_or_create_workbook(filepath)
     row_num = ws.max_row + 1
     header_map = _build_header_map(ws)
 
@@ -828,44 +840,71 @@ def write_not_invoice_row(filepath, source_path, status_callback=None):
         except Exception:
             pass
 
-    wb.save(filepath)
+    if workbook is None:
+        wb.save(filepath)
 
 
-def read_spreadsheet_rows(filepath):
-    """Read all data rows from the spreadsheet.
+def iter_spreadsheet_rows(filepath):
+    """Yield data rows from the spreadsheet one at a time.
 
-    Returns:
-        list: List of dicts, one per row, with column keys from COLUMNS
+    XLSX files are opened read-only and streamed, so memory does not grow with
+    the sheet; the workbook is closed once the iterator is exhausted or closed.
+
+    Yields:
+        dict: One row with column keys from COLUMNS plus '_row_num'
     """
     if not os.path.exists(filepath):
-        return []
+        return
 
     if _is_csv(filepath):
-        rows = []
         with open(filepath, newline='', encoding='utf-8') as f:
             reader = csv.DictReader(f)
             for idx, row in enumerate(reader, start=2):  # Header is row 1
                 row_data = {'_row_num': idx}
                 for key, header in COLUMNS:
                     row_data[key] = row.get(header, '') or ''
-                rows.append(row_data)
-        return rows
+                yield row_data
+        return
 
-    wb = load_workbook(filepath)
-    ws = wb.active
-    header_map = _build_header_map(ws)
+    wb = load_workbook(filepath, read_only=True)
+    try:
+        row_values = wb.active.iter_rows(values_only=True)
+        header_row = next(row_values, None)
+        if header_row is None:
+            return
+        header_map = {}
+        for col, value in enumerate(header_row, start=1):
+            if value is None:
+                continue
+            header_key = str(value).strip().lower()
+            if header_key and header_key not in header_map:
+                header_map[header_key] = col
 
-    rows = []
-    for row_num in range(2, ws.max_row + 1):  # Skip header
-        row_data = {'_row_num': row_num}
+        # Resolve each key's column once, then read row values in bulk.
+        columns = []
         for key, header in COLUMNS:
             col_idx = header_map.get(str(header).strip().lower())
             if not col_idx:
                 col_idx = _preferred_col_for_key(key)
-            row_data[key] = ws.cell(row=row_num, column=col_idx).value or ''
-        rows.append(row_data)
+            columns.append((key, col_idx - 1))
+
+        for row_num, values in enumerate(row_values, start=2):  # Skip header
+            row_data = {'_row_num': row_num}
+            width = len(values)
+            for key, idx in columns:
+                row_data[key] = (values[idx] if idx < width else None) or ''
+            yield row_data
+    finally:
+        wb.close()
+
+
+def read_spreadsheet_rows(filepath):
+    """Read all data rows from the spreadsheet.
 
-    return rows
+    Returns:
+        list: List of dicts, one per row, with column keys from COLUMNS
+    """
+    return list(iter_spreadsheet_rows(filepath))
 
 
 def _ensure_validation_headers(ws):
@@ -1013,10 +1052,27 @@ def _apply_shopify_core_to_ws(ws, row_num, shopify_core_col, core_update):
             ws.cell(row=row_num, column=col_idx).fill = fill
 
 
-def _write_validation_results_csv(filepath, updates, margin_updates=None, shopify_core_updates=None):
+def _apply_sku_updates_to_csv_rows(headers, rows, sku_updates):
+    if 'SKU' not in headers:
+        headers.append('SKU')
+    for row_num, sku in sku_updates.items():
+        idx = row_num - 2
+        if idx < 0 or idx >= len(rows):
+            continue
+        rows[idx]['SKU'] = str(sku or '').strip()
+
+
+def _apply_sku_updates_to_ws(ws, sku_updates):
+    sku_col = _resolve_col_by_key(ws, 'sku', create_if_missing=True)
+    for row_num, sku in sku_updates.items():
+        ws.cell(row=row_num, column=sku_col).value = str(sku or '').strip()
+
+
+def _write_validation_results_csv(filepath, updates, margin_updates=None, shopify_core_updates=None,
+                                  sku_updates=None):
     if not updates or not os.path.exists(filepath):
-        # Allow margin-only updates.
-        if (not margin_updates and not shopify_core_updates) or not os.path.exists(filepath):
+        # Allow margin/SKU-only updates.
+        if (not margin_updates and not shopify_core_updates and not sku_updates) or not os.path.exists(filepath):
             return
 
     with open(filepath, newline='', encoding='utf-8') as f:
@@ -1027,6 +1083,9 @@ def _write_validation_results_csv(filepath, updates, margin_updates=None, shopif
     if not headers:
         headers = [header for _, header in COLUMNS]
 
+    if sku_updates:
+        _apply_sku_updates_to_csv_rows(headers, rows, sku_updates)
+
     for header in ('SkuNexus Validation', 'SkuNexus Failed Fields', 'SkuNexus Margin', 'Shopify CORE'):
         if header not in headers:
             headers.append(header)
@@ -1073,11 +1132,14 @@ def _write_validation_results_csv(filepath, updates, margin_updates=None, shopif
             writer.writerow({h: row.get(h, '') for h in headers})
 
 
-def _write_validation_results_xlsx(filepath, updates, margin_updates=None, shopify_core_updates=None):
-    if not updates and not margin_updates and not shopify_core_updates:
+def _write_validation_results_xlsx(filepath, updates, margin_updates=None, shopify_core_updates=None,
+                                   sku_updates=None):
+    if not updates and not margin_updates and not shopify_core_updates and not sku_updates:
         return
     wb = load_workbook(filepath)
     ws = wb.active
+    if sku_updates:
+        _apply_sku_updates_to_ws(ws, sku_updates)
     _normalize_tail_columns(ws)
     margin_col, validation_col, failed_col, shopify_core_col = _ensure_validation_headers(ws)
     for row_num, margin_value in (margin_updates or {}).items():
@@ -1098,7 +1160,8 @@ def _write_validation_results_xlsx(filepath, updates, margin_updates=None, shopi
         ) from e
 
 
-def write_validation_results(filepath, updates, margin_updates=None, shopify_core_updates=None):
+def write_validation_results(filepath, updates, margin_updates=None, shopify_core_updates=None,
+                             sku_updates=None):
     """Write multiple validation results in one pass.
 
     Args:
@@ -1106,11 +1169,16 @@ def write_validation_results(filepath, updates, margin_updates=None, shopify_cor
         updates: dict {row_num: (is_valid, failed_fields)}
         margin_updates: optional dict {row_num: margin_float}
         shopify_core_updates: optional dict {row_num: (value, status)}
+        sku_updates: optional dict {row_num: inferred_sku}
     """
     if _is_csv(filepath):
-        _write_validation_results_csv(filepath, updates, margin_updates, shopify_core_updates)
+        _write_validation_results_csv(
+            filepath, updates, margin_updates, shopify_core_updates, sku_updates
+        )
     else:
-        _write_validation_results_xlsx(filepath, updates, margin_updates, shopify_core_updates)
+        _write_validation_results_xlsx(
+            filepath, updates, margin_updates, shopify_core_updates, sku_updates
+        )
 
 
 def write_sku_updates(filepath, sku_updates):
@@ -1126,14 +1194,7 @@ def write_sku_updates(filepath, sku_updates):
 
         if not headers:
             headers = [header for _, header in COLUMNS]
-        if 'SKU' not in headers:
-            headers.append('SKU')
-
-        for row_num, sku in sku_updates.items():
-            idx = row_num - 2
-            if idx < 0 or idx >= len(rows):
-                continue
-            rows[idx]['SKU'] = str(sku or '').strip()
+        _apply_sku_updates_to_csv_rows(headers, rows, sku_updates)
 
         with open(filepath, 'w', newline='', encoding='utf-8') as f:
             writer = csv.DictWriter(f, fieldnames=headers)
@@ -1144,9 +1205,7 @@ def write_sku_updates(filepath, sku_updates):
 
     wb = load_workbook(filepath)
     ws = wb.active
-    sku_col = _resolve_col_by_key(ws, 'sku', create_if_missing=True)
-    for row_num, sku in sku_updates.items():
-        ws.cell(row=row_num, column=sku_col).value = str(sku or '').strip()
+    _apply_sku_updates_to_ws(ws, sku_updates)
     try:
         wb.save(filepath)
     except PermissionError as e:
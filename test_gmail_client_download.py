@@ -1,10 +1,18 @@
 import json
 import os
 import tempfile
+import time
 import unittest
 import base64
+import pickle
+from unittest import mock
 
-from gmail_client import GmailClient, _extract_sb_body_order_url, _html_to_text, _message_matches_time_filter
+import httplib2
+from googleapiclient.errors import HttpError
+
+import gmail_client
+from gmail_client import GmailClient, retry_with_backoff, _select_headers, _extract_sb_body_order_url, _html_to_text, _message_matches_time_filter
+from invoice_extractor_gui import _load_sender_sidecar, _save_sender_sidecar
 
 
 SB_BODY = """---------- Forwarded message ---------
@@ -43,7 +51,92 @@ customerservice@sbfilters.com
 """
 
 
+class _FakeBatch:
+    def __init__(self, callback, batch_sizes, failing_ids=()):
+        self.callback = callback
+        self.batch_sizes = batch_sizes
+        self.failing_ids = set(failing_ids)
+        self.requests = []
+
+    def add(self, request, request_id=None):
+        self.requests.append((request_id, request))
+
+    def execute(self, http=None):
+        self.batch_sizes.append(len(self.requests))
+        for request_id, request in self.requests:
+            if request_id in self.failing_ids:
+                self.callback(request_id, None, RuntimeError('rate limited'))
+            else:
+                self.callback(request_id, request, None)
+
+
+class _FakeAttachmentRequest:
+    def __init__(self, attachment_id):
+        self.attachment_id = attachment_id
+
+    def execute(self, http=None):
+        data = f'data for {self.attachment_id}'.encode()
+        return {'data': base64.urlsafe_b64encode(data).decode()}
+
+
+class _FakeAttachments:
+    def get(self, userId, messageId, id, **kwargs):
+        return _FakeAttachmentRequest(id)
+
+
+class _FakeListRequest:
+    def execute(self):
+        return {'messages': [{'id': 'msg-1'}]}
+
+
+class _FakeGmailService:
+    def __init__(self, failing_ids=()):
+        self.batch_sizes = []
+        self.failing_ids = failing_ids
+        self.list_calls = []
+        self.modify_bodies = []
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def get(self, userId, id, format, **kwargs):
+        return {'id': id, 'format': format}
+
+    def attachments(self):
+        return _FakeAttachments()
+
+    def labels(self):
+        return self
+
+    def list(self, **kwargs):
+        self.list_calls.append(kwargs)
+        return _FakeListRequest()
+
+    def batchModify(self, userId, body):
+        self.modify_bodies.append(body)
+        return _FakeListRequest()
+
+    def new_batch_http_request(self, callback):
+        return _FakeBatch(callback, self.batch_sizes, self.failing_ids)
+
+
 class GmailClientDownloadTests(unittest.TestCase):
+    def test_get_messages_batch_groups_requests_per_http_call(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            client = GmailClient(tmpdir, data_dir=tmpdir, invoices_dir=tmpdir)
+            client.service = _FakeGmailService(failing_ids={'msg-7'})
+            msg_ids = [f'msg-{i}' for i in range(150)]
+
+            messages = client.get_messages_batch(msg_ids)
+
+        self.assertEqual(client.service.batch_sizes, [100, 50])
+        self.assertEqual(len(messages), 149)
+        self.assertNotIn('msg-7', messages)
+        self.assertEqual(messages['msg-0'], {'id': 'msg-0', 'format': 'full'})
+
     def test_extracts_sb_signed_order_url_from_html_anchor(self):
         signed_url = (
             'https://sbfilters.com/69841617189/orders/'
@@ -78,13 +171,14 @@ class GmailClientDownloadTests(unittest.TestCase):
                 data_dir=tmpdir,
                 invoices_dir=tmpdir,
                 should_stop=lambda: stop_state['stop'],
+                download_workers=1,
             )
             client.processed_label_id = 'label-1'
 
             labeled = []
 
-            client.fetch_all_message_ids = lambda query=None: [{'id': 'msg-1'}]
-            client.get_message_details = lambda msg_id: {
+            client.fetch_all_message_ids = lambda query=None: ['msg-1']
+            client.get_messages_batch = lambda msg_ids, **kwargs: {msg_id: {
                 'payload': {
                     'headers': [
                         {'name': 'Subject', 'value': 'Test'},
@@ -95,7 +189,7 @@ class GmailClientDownloadTests(unittest.TestCase):
                         {'filename': 'b.pdf', 'body': {'attachmentId': 'att-2'}},
                     ],
                 }
-            }
+            } for msg_id in msg_ids}
             client.find_attachments_in_parts = lambda parts, msg_id: [
                 {'filename': 'a.pdf', 'attachment_id': 'att-1', 'msg_id': msg_id},
                 {'filename': 'b.pdf', 'attachment_id': 'att-2', 'msg_id': msg_id},
@@ -107,7 +201,9 @@ class GmailClientDownloadTests(unittest.TestCase):
                 return filename
 
             client.download_attachment = fake_download
-            client._add_label_to_message = lambda msg_id, label_id: labeled.append((msg_id, label_id))
+            client._add_label_to_messages = lambda msg_ids, label_id: labeled.extend(
+                (msg_id, label_id) for msg_id in msg_ids
+            )
 
             downloaded, total_emails, new_emails = client.fetch_and_download_new_attachments()
 
@@ -116,6 +212,392 @@ class GmailClientDownloadTests(unittest.TestCase):
         self.assertEqual(len(downloaded), 1)
         self.assertEqual(labeled, [])
 
+    def test_label_cache_is_scoped_to_account_and_label_name(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            client = GmailClient(tmpdir, data_dir=tmpdir, invoices_dir=tmpdir)
+            client._save_cached_label_id('ap@example.com', 'InvoiceExtractor-Processed', 'Label_7')
+
+            self.assertEqual(
+                client._load_cached_label_id('ap@example.com', 'InvoiceExtractor-Processed'),
+                'Label_7',
+            )
+            self.assertIsNone(client._load_cached_label_id('other@example.com', 'InvoiceExtractor-Processed'))
+            self.assertIsNone(client._load_cached_label_id('ap@example.com', 'Other-Label'))
+
+            client._clear_label_cache()
+            self.assertIsNone(client._load_cached_label_id('ap@example.com', 'InvoiceExtractor-Processed'))
+
+    def test_legacy_pickle_token_is_migrated_to_json(self):
+        from google.oauth2.credentials import Credentials
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            client = GmailClient(tmpdir, data_dir=tmpdir, invoices_dir=tmpdir)
+            legacy = Credentials(
+                token='access', refresh_token='refresh', client_id='cid',
+                client_secret='secret', token_uri='https://oauth2.googleapis.com/token',
+            )
+            with open(client.legacy_token_file, 'wb') as f:
+                pickle.dump(legacy, f)
+
+            creds, should_persist = client._load_cached_credentials()
+            self.assertTrue(should_persist)
+            client._save_credentials(creds)
+
+            self.assertFalse(os.path.exists(client.legacy_token_file))
+            reloaded, should_persist = client._load_cached_credentials()
+
+        self.assertFalse(should_persist)
+        self.assertEqual(reloaded.refresh_token, 'refresh')
+        self.assertEqual(reloaded.client_id, 'cid')
+
+    def test_authenticate_reuses_cached_service_in_process(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            first = GmailClient(tmpdir, data_dir=tmpdir, invoices_dir=tmpdir)
+            open(first.token_file, 'w').close()
+
+            class _ValidCreds:
+                valid = True
+
+            service = object()
+            gmail_client._SERVICE_CACHE[first._service_cache_key()] = {
+                'creds': _ValidCreds(),
+                'service': service,
+                'profile': {'emailAddress': 'ap@example.com'},
+                'email': 'ap@example.com',
+                'processed_label_id': 'Label_7',
+            }
+            try:
+                second = GmailClient(tmpdir, data_dir=tmpdir, invoices_dir=tmpdir)
+                profile = second.authenticate()
+            finally:
+                second._clear_cached_token()
+
+        self.assertIs(second.service, service)
+        self.assertEqual(second.processed_label_id, 'Label_7')
+        self.assertEqual(profile, {'emailAddress': 'ap@example.com'})
+        self.assertEqual(gmail_client._SERVICE_CACHE, {})
+
+    def test_credentials_refresh_only_near_expiry(self):
+        from datetime import datetime, timedelta, timezone
+
+        class _Creds:
+            refresh_token = 'refresh'
+
+            def __init__(self, expires_in):
+                self.expiry = datetime.now(timezone.utc).replace(tzinfo=None) + expires_in
+                self.refreshed = 0
+
+            def refresh(self, request):
+                self.refreshed += 1
+                self.expiry += timedelta(hours=1)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            client = GmailClient(tmpdir, data_dir=tmpdir, invoices_dir=tmpdir)
+            client._save_credentials = lambda creds: None
+
+            client.creds = _Creds(timedelta(minutes=30))
+            client._ensure_fresh_credentials()
+            self.assertEqual(client.creds.refreshed, 0)
+
+            client.creds = _Creds(timedelta(minutes=2))
+            client._ensure_fresh_credentials()
+            client._ensure_fresh_credentials()
+            self.assertEqual(client.creds.refreshed, 1)
+
+    def test_select_headers_returns_only_requested_names(self):
+        payload = {'headers': [
+            {'name': 'Received', 'value': 'from mx'},
+            {'name': 'From', 'value': 'KC Turbos <invoicing@kcturbos.com>'},
+            {'name': 'DKIM-Signature', 'value': 'v=1'},
+            {'name': 'Subject', 'value': 'Invoice 42'},
+        ]}
+
+        self.assertEqual(
+            _select_headers(payload, ('Subject', 'From')),
+            {'From': 'KC Turbos <invoicing@kcturbos.com>', 'Subject': 'Invoice 42'},
+        )
+        self.assertEqual(_select_headers({}, ('Subject',)), {})
+
+    def test_find_attachments_walks_nested_parts_in_message_order(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            client = GmailClient(tmpdir, data_dir=tmpdir, invoices_dir=tmpdir)
+            payload = {
+                'mimeType': 'multipart/mixed',
+                'parts': [
+                    {'mimeType': 'multipart/alternative', 'parts': [
+                        {'mimeType': 'text/plain', 'body': {'size': 5}},
+                        {'filename': 'logo.png', 'body': {'attachmentId': 'att-1'}},
+                    ]},
+                    {'filename': 'invoice.pdf', 'mimeType': 'application/pdf',
+                     'body': {'attachmentId': 'att-2', 'size': 10}},
+                ],
+            }
+            single_part = {'filename': 'only.pdf', 'body': {'attachmentId': 'att-3'}}
+
+            nested = client.find_attachments_in_parts([payload], 'msg-1')
+            single = client.find_attachments_in_parts([single_part], 'msg-2')
+
+        self.assertEqual([a['attachment_id'] for a in nested], ['att-1', 'att-2'])
+        self.assertEqual(nested[1]['mime_type'], 'application/pdf')
+        self.assertEqual([a['filename'] for a in single], ['only.pdf'])
+
+    def test_labels_are_applied_with_batch_modify_in_slices(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            client = GmailClient(tmpdir, data_dir=tmpdir, invoices_dir=tmpdir)
+            client.service = _FakeGmailService()
+            client.processed_label_id = 'label-1'
+
+            for n in range(gmail_client.LABEL_FLUSH_SIZE + 2):
+                client._queue_label(f'msg-{n}')
+            flushed_early = len(client.service.modify_bodies)
+            client._flush_labels()
+
+        bodies = client.service.modify_bodies
+        self.assertEqual(flushed_early, 1)
+        self.assertEqual([len(b['ids']) for b in bodies], [gmail_client.LABEL_FLUSH_SIZE, 2])
+        self.assertEqual(bodies[0]['addLabelIds'], ['label-1'])
+        self.assertEqual(client._pending_label_ids, [])
+
+    def test_gmail_resources_are_built_once_per_service(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            client = GmailClient(tmpdir, data_dir=tmpdir, invoices_dir=tmpdir)
+            service = _FakeGmailService()
+            users_calls = []
+            service.users = lambda: users_calls.append(1) or service
+            client.service = service
+
+            client.fetch_all_message_ids()
+            client.download_attachment('msg-1', 'att-1', 'a.pdf')
+            self.assertEqual(len(users_calls), 1)
+
+            client.service = _FakeGmailService()
+            self.assertIsNot(client._messages, service)
+
+    def test_single_attachment_emails_download_concurrently(self):
+        import threading
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            client = GmailClient(tmpdir, data_dir=tmpdir, invoices_dir=tmpdir, download_workers=2)
+            client.processed_label_id = 'label-1'
+            both_in_flight = threading.Barrier(2, timeout=5)
+            labeled = []
+
+            client.fetch_all_message_ids = lambda query=None: ['msg-1', 'msg-2']
+            client.get_messages_batch = lambda msg_ids, **kwargs: {msg_id: {
+                'payload': {'headers': [{'name': 'Subject', 'value': msg_id}]}
+            } for msg_id in msg_ids}
+            client.find_attachments_in_parts = lambda parts, msg_id: [
+                {'filename': f'{msg_id}.pdf', 'attachment_id': 'att-1', 'msg_id': msg_id},
+            ]
+
+            def fake_download(msg_id, attachment_id, filename):
+                # Only passes if both emails' downloads are running at once.
+                both_in_flight.wait()
+                return filename
+
+            client.download_attachment = fake_download
+            client._add_label_to_messages = lambda msg_ids, label_id: labeled.extend(msg_ids)
+
+            downloaded, _, _ = client.fetch_and_download_new_attachments()
+
+        self.assertEqual([d['filename'] for d in downloaded], ['msg-1.pdf', 'msg-2.pdf'])
+        self.assertEqual([d['subject'] for d in downloaded], ['msg-1', 'msg-2'])
+        self.assertEqual(labeled, ['msg-1', 'msg-2'])
+
+    def test_fetch_all_message_ids_defaults_to_unprocessed_query(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            client = GmailClient(tmpdir, data_dir=tmpdir, invoices_dir=tmpdir)
+            client.service = _FakeGmailService()
+
+            messages = client.fetch_all_message_ids()
+            client.fetch_all_message_ids(query='')
+
+        self.assertEqual(messages, ['msg-1'])
+        self.assertEqual(client.service.list_calls[0]['q'], '-label:InvoiceExtractor-Processed')
+        self.assertNotIn('q', client.service.list_calls[1])
+
+    def test_parallel_downloads_keep_attachment_order_and_unique_names(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            client = GmailClient(tmpdir, data_dir=tmpdir, invoices_dir=tmpdir, download_workers=4)
+            client.processed_label_id = 'label-1'
+            client.service = _FakeGmailService()
+
+            labeled = []
+            client.fetch_all_message_ids = lambda query=None: ['msg-1']
+            client.get_messages_batch = lambda msg_ids, **kwargs: {msg_id: {
+                'payload': {'headers': [{'name': 'Subject', 'value': 'Test'}]}
+            } for msg_id in msg_ids}
+            client.find_attachments_in_parts = lambda parts, msg_id: [
+                {'filename': 'invoice.pdf', 'attachment_id': f'att-{n}', 'msg_id': msg_id}
+                for n in range(6)
+            ]
+            client._add_label_to_messages = lambda msg_ids, label_id: labeled.extend(msg_ids)
+
+            downloaded, _, _ = client.fetch_and_download_new_attachments()
+            saved = sorted(os.listdir(tmpdir))
+
+        self.assertEqual(len(downloaded), 6)
+        self.assertEqual(len(set(d['filename'] for d in downloaded)), 6)
+        self.assertEqual(saved, sorted(d['filename'] for d in downloaded))
+        self.assertEqual(labeled, ['msg-1'])
+
+    def test_download_attachment_decodes_in_chunks(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            client = GmailClient(tmpdir, data_dir=tmpdir, invoices_dir=tmpdir)
+            client.service = _FakeGmailService()
+            original_chunk = gmail_client.ATTACHMENT_DECODE_CHUNK_CHARS
+            gmail_client.ATTACHMENT_DECODE_CHUNK_CHARS = 8
+            try:
+                saved_name = client.download_attachment('msg-1', 'att-123', 'a.pdf')
+            finally:
+                gmail_client.ATTACHMENT_DECODE_CHUNK_CHARS = original_chunk
+            with open(os.path.join(tmpdir, saved_name), 'rb') as f:
+                content = f.read()
+
+        self.assertEqual(saved_name, 'a.pdf')
+        self.assertEqual(content, b'data for att-123')
+
+    def test_non_invoice_attachment_types_are_not_downloaded(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            client = GmailClient(tmpdir, data_dir=tmpdir, invoices_dir=tmpdir)
+            client.processed_label_id = 'label-1'
+
+            downloads = []
+            labeled = []
+            attachments_by_msg = {
+                'msg-1': [
+                    {'filename': 'invoice.PDF', 'attachment_id': 'att-1'},
+                    {'filename': 'terms.docx', 'attachment_id': 'att-2'},
+                ],
+                'msg-2': [{'filename': 'calendar.ics', 'attachment_id': 'att-3'}],
+            }
+            client.fetch_all_message_ids = lambda query=None: ['msg-1', 'msg-2']
+            client.get_messages_batch = lambda msg_ids, **kwargs: {msg_id: {
+                'payload': {'headers': [{'name': 'Subject', 'value': 'Test'}]}
+            } for msg_id in msg_ids}
+            client.find_attachments_in_parts = lambda parts, msg_id: [
+                dict(att, msg_id=msg_id) for att in attachments_by_msg[msg_id]
+            ]
+
+            def fake_download(msg_id, attachment_id, filename):
+                downloads.append(filename)
+                return filename
+
+            client.download_attachment = fake_download
+            client._add_label_to_messages = lambda msg_ids, label_id: labeled.extend(msg_ids)
+
+            downloaded, _, _ = client.fetch_and_download_new_attachments()
+
+        self.assertEqual(downloads, ['invoice.PDF'])
+        self.assertEqual([d['filename'] for d in downloaded], ['invoice.PDF'])
+        self.assertEqual(labeled, ['msg-1', 'msg-2'])
+
+    def test_download_attachment_sanitizes_name_and_avoids_collisions(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            client = GmailClient(tmpdir, data_dir=tmpdir, invoices_dir=tmpdir)
+            client.service = _FakeGmailService()
+
+            first = client.download_attachment('msg-1', 'att-1', 'inv/2026:04?.pdf')
+            second = client.download_attachment('msg-1', 'att-2', 'inv\\2026:04?.pdf')
+
+        self.assertEqual(first, 'inv_2026_04_.pdf')
+        self.assertEqual(second, 'inv_2026_04__1.pdf')
+
+    def test_unique_file_names_use_cached_listing_with_create_guard(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for existing in ('invoice.pdf', 'invoice_1.pdf'):
+                open(os.path.join(tmpdir, existing), 'w').close()
+            client = GmailClient(tmpdir, data_dir=tmpdir, invoices_dir=tmpdir)
+
+            name, _, f = client._open_unique_file('invoice.pdf', 'xb')
+            f.close()
+            # Appears after the listing was cached; the exclusive create still skips it.
+            open(os.path.join(tmpdir, 'invoice_3.pdf'), 'w').close()
+            later, _, f = client._open_unique_file('invoice.pdf', 'xb')
+            f.close()
+
+        self.assertEqual(name, 'invoice_2.pdf')
+        self.assertEqual(later, 'invoice_4.pdf')
+
+    def test_identical_attachment_content_is_saved_once(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            client = GmailClient(tmpdir, data_dir=tmpdir, invoices_dir=tmpdir)
+            client.service = _FakeGmailService()
+
+            first = client.download_attachment('msg-1', 'att-1', 'invoice.pdf')
+            resent = client.download_attachment('msg-2', 'att-1', 'invoice-resend.pdf')
+            different = client.download_attachment('msg-3', 'att-2', 'invoice.pdf')
+            saved = sorted(os.listdir(tmpdir))
+
+        self.assertEqual(first, 'invoice.pdf')
+        self.assertIs(resent, gmail_client.DUPLICATE_ATTACHMENT)
+        self.assertEqual(different, 'invoice_1.pdf')
+        self.assertEqual(saved, ['invoice.pdf', 'invoice_1.pdf'])
+
+    def test_resent_identical_attachment_keeps_first_email_sender_sidecar(self):
+        senders = {
+            'msg-1': 'KC Turbos <invoicing@kcturbos.com>',
+            'msg-2': 'Accounts Payable <ap@dieselpowerproducts.com>',
+        }
+        with tempfile.TemporaryDirectory() as tmpdir:
+            client = GmailClient(tmpdir, data_dir=tmpdir, invoices_dir=tmpdir)
+            client.service = _FakeGmailService()
+            client.processed_label_id = 'label-1'
+            client.fetch_all_message_ids = lambda query=None: ['msg-1', 'msg-2']
+            client.get_messages_batch = lambda msg_ids, **kwargs: {msg_id: {
+                'payload': {'headers': [
+                    {'name': 'Subject', 'value': f'Invoice {msg_id}'},
+                    {'name': 'From', 'value': senders[msg_id]},
+                ]}
+            } for msg_id in msg_ids}
+            # Both emails carry the same attachment bytes under different names.
+            client.find_attachments_in_parts = lambda parts, msg_id: [
+                {'filename': f'{msg_id}.pdf', 'attachment_id': 'att-1', 'msg_id': msg_id},
+            ]
+            client._add_label_to_messages = lambda msg_ids, label_id: None
+
+            downloaded, _, _ = client.fetch_and_download_new_attachments()
+
+            # run_pipeline writes one sidecar per download record.
+            for record in downloaded:
+                _save_sender_sidecar(os.path.join(tmpdir, record['filename']), record)
+            sidecar = _load_sender_sidecar(os.path.join(tmpdir, 'msg-1.pdf'))
+            saved = sorted(name for name in os.listdir(tmpdir) if name.endswith('.pdf'))
+
+        self.assertEqual([record['filename'] for record in downloaded], ['msg-1.pdf'])
+        self.assertEqual(saved, ['msg-1.pdf'])
+        self.assertEqual(sidecar['sender_email'], 'invoicing@kcturbos.com')
+        self.assertEqual(sidecar['subject'], 'Invoice msg-1')
+
+    def test_status_lines_are_collapsed_per_email(self):
+        statuses = []
+        with tempfile.TemporaryDirectory() as tmpdir:
+            client = GmailClient(
+                tmpdir,
+                data_dir=tmpdir,
+                invoices_dir=tmpdir,
+                status_callback=lambda msg, tag=None: statuses.append(msg),
+            )
+            client.processed_label_id = 'label-1'
+            client.fetch_all_message_ids = lambda query=None: [f'msg-{n}' for n in range(1, 6)]
+            client.get_messages_batch = lambda msg_ids, **kwargs: {msg_id: {
+                'payload': {'headers': [{'name': 'Subject', 'value': 'Test'}]}
+            } for msg_id in msg_ids}
+            client.find_attachments_in_parts = lambda parts, msg_id: [
+                {'filename': f'{msg_id}-a.pdf', 'attachment_id': 'att-1', 'msg_id': msg_id},
+                {'filename': f'{msg_id}-b.pdf', 'attachment_id': 'att-2', 'msg_id': msg_id},
+            ]
+            client.download_attachment = lambda msg_id, attachment_id, filename: filename
+            client._add_label_to_messages = lambda msg_ids, label_id: None
+
+            client.fetch_and_download_new_attachments()
+
+        checking = [msg for msg in statuses if msg.startswith('Checking email')]
+        self.assertEqual(checking[0], 'Checking email 1/5...')
+        self.assertEqual(checking[-1], 'Checking email 5/5...')
+        self.assertIn('    Downloaded: msg-1-a.pdf, msg-1-b.pdf', statuses)
+        self.assertEqual(sum(msg.startswith('    Downloaded:') for msg in statuses), 5)
+
     def test_download_error_does_not_label_message(self):
         with tempfile.TemporaryDirectory() as tmpdir:
             client = GmailClient(tmpdir, data_dir=tmpdir, invoices_dir=tmpdir)
@@ -123,8 +605,8 @@ class GmailClientDownloadTests(unittest.TestCase):
 
             labeled = []
 
-            client.fetch_all_message_ids = lambda query=None: [{'id': 'msg-1'}]
-            client.get_message_details = lambda msg_id: {
+            client.fetch_all_message_ids = lambda query=None: ['msg-1']
+            client.get_messages_batch = lambda msg_ids, **kwargs: {msg_id: {
                 'payload': {
                     'headers': [
                         {'name': 'Subject', 'value': 'Test'},
@@ -134,14 +616,16 @@ class GmailClientDownloadTests(unittest.TestCase):
                         {'filename': 'a.pdf', 'body': {'attachmentId': 'att-1'}},
                     ],
                 }
-            }
+            } for msg_id in msg_ids}
             client.find_attachments_in_parts = lambda parts, msg_id: [
                 {'filename': 'a.pdf', 'attachment_id': 'att-1', 'msg_id': msg_id},
             ]
             client.download_attachment = lambda msg_id, attachment_id, filename: (_ for _ in ()).throw(
                 RuntimeError('download failed')
             )
-            client._add_label_to_message = lambda msg_id, label_id: labeled.append((msg_id, label_id))
+            client._add_label_to_messages = lambda msg_ids, label_id: labeled.extend(
+                (msg_id, label_id) for msg_id in msg_ids
+            )
 
             downloaded, total_emails, new_emails = client.fetch_and_download_new_attachments()
 
@@ -169,8 +653,8 @@ class GmailClientDownloadTests(unittest.TestCase):
 
             labeled = []
 
-            client.fetch_all_message_ids = lambda query=None: [{'id': 'msg-1'}]
-            client.get_message_details = lambda msg_id: {
+            client.fetch_all_message_ids = lambda query=None: ['msg-1']
+            client.get_messages_batch = lambda msg_ids, **kwargs: {msg_id: {
                 'snippet': 'Forwarded message from KC Turbos Invoicing',
                 'payload': {
                     'headers': [
@@ -194,12 +678,14 @@ class GmailClientDownloadTests(unittest.TestCase):
                         },
                     ],
                 }
-            }
+            } for msg_id in msg_ids}
             client.find_attachments_in_parts = lambda parts, msg_id: [
                 {'filename': 'kc.pdf', 'attachment_id': 'att-1', 'msg_id': msg_id},
             ]
             client.download_attachment = lambda msg_id, attachment_id, filename: filename
-            client._add_label_to_message = lambda msg_id, label_id: labeled.append((msg_id, label_id))
+            client._add_label_to_messages = lambda msg_ids, label_id: labeled.extend(
+                (msg_id, label_id) for msg_id in msg_ids
+            )
 
             downloaded, total_emails, new_emails = client.fetch_and_download_new_attachments()
 
@@ -220,8 +706,8 @@ class GmailClientDownloadTests(unittest.TestCase):
 
             labeled = []
 
-            client.fetch_all_message_ids = lambda query=None: [{'id': 'msg-1'}]
-            client.get_message_details = lambda msg_id: {
+            client.fetch_all_message_ids = lambda query=None: ['msg-1']
+            client.get_messages_batch = lambda msg_ids, **kwargs: {msg_id: {
                 'internalDate': '1712520000000',
                 'payload': {
                     'headers': [
@@ -232,12 +718,14 @@ class GmailClientDownloadTests(unittest.TestCase):
                         {'filename': 'a.pdf', 'body': {'attachmentId': 'att-1'}},
                     ],
                 }
-            }
+            } for msg_id in msg_ids}
             client.find_attachments_in_parts = lambda parts, msg_id: [
                 {'filename': 'a.pdf', 'attachment_id': 'att-1', 'msg_id': msg_id},
             ]
             client.download_attachment = lambda msg_id, attachment_id, filename: filename
-            client._add_label_to_message = lambda msg_id, label_id: labeled.append((msg_id, label_id))
+            client._add_label_to_messages = lambda msg_ids, label_id: labeled.extend(
+                (msg_id, label_id) for msg_id in msg_ids
+            )
 
             downloaded, total_emails, new_emails = client.fetch_and_download_new_attachments(
                 query='after:1712510000 before:1712515000',
@@ -249,6 +737,72 @@ class GmailClientDownloadTests(unittest.TestCase):
         self.assertEqual(new_emails, 1)
         self.assertEqual(labeled, [])
 
+    def test_next_chunk_is_prefetched_before_current_chunk_is_processed(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            client = GmailClient(tmpdir, data_dir=tmpdir, invoices_dir=tmpdir)
+            client.processed_label_id = 'label-1'
+            msg_ids = [f'msg-{n}' for n in range(gmail_client.GMAIL_BATCH_SIZE + 5)]
+
+            fetched_chunks = []
+            client.fetch_all_message_ids = lambda query=None: msg_ids
+
+            def fake_batch(chunk_ids, **kwargs):
+                fetched_chunks.append(chunk_ids[0])
+                return {msg_id: {'payload': {}} for msg_id in chunk_ids}
+
+            def fake_find(parts, msg_id):
+                if msg_id == 'msg-0':
+                    # Give the background prefetch a moment, then check it ran.
+                    for _ in range(200):
+                        if len(fetched_chunks) == 2:
+                            break
+                        time.sleep(0.01)
+                    seen_at_first_message.extend(fetched_chunks)
+                return []
+
+            seen_at_first_message = []
+            client.get_messages_batch = fake_batch
+            client.find_attachments_in_parts = fake_find
+            client.get_message_details = lambda msg_id: self.fail(f'unexpected single fetch {msg_id}')
+            client._add_label_to_messages = lambda msg_ids, label_id: None
+
+            client.fetch_and_download_new_attachments()
+
+        self.assertEqual(seen_at_first_message, ['msg-0', f'msg-{gmail_client.GMAIL_BATCH_SIZE}'])
+        self.assertEqual(len(fetched_chunks), 2)
+
+    def test_time_filter_metadata_pass_skips_full_fetch_outside_window(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            client = GmailClient(tmpdir, data_dir=tmpdir, invoices_dir=tmpdir)
+            client.processed_label_id = 'label-1'
+
+            fetch_calls = []
+            internal_dates = {'msg-in': '1712512000000', 'msg-out': '1712520000000'}
+
+            def fake_batch(msg_ids, fmt='full', metadata_headers=None):
+                fetch_calls.append((fmt, list(msg_ids)))
+                return {
+                    msg_id: {
+                        'internalDate': internal_dates[msg_id],
+                        'payload': {'headers': [{'name': 'Subject', 'value': 'Test'}]},
+                    }
+                    for msg_id in msg_ids
+                }
+
+            client.fetch_all_message_ids = lambda query=None: ['msg-in', 'msg-out']
+            client.get_messages_batch = fake_batch
+            client._add_label_to_messages = lambda msg_ids, label_id: None
+
+            client.fetch_and_download_new_attachments(
+                query='after:1712510000 before:1712515000',
+                message_time_filter={'start_ts': 1712510000, 'end_ts': 1712515000},
+            )
+
+        self.assertEqual(
+            fetch_calls,
+            [('metadata', ['msg-in', 'msg-out']), ('full', ['msg-in'])],
+        )
+
     def test_no_attachment_sb_body_invoice_is_saved_and_labeled(self):
         encoded_body = base64.urlsafe_b64encode(
             SB_BODY.encode('utf-8')
@@ -260,8 +814,8 @@ class GmailClientDownloadTests(unittest.TestCase):
 
             labeled = []
 
-            client.fetch_all_message_ids = lambda query=None: [{'id': 'msg-sb'}]
-            client.get_message_details = lambda msg_id: {
+            client.fetch_all_message_ids = lambda query=None: ['msg-sb']
+            client.get_messages_batch = lambda msg_ids, **kwargs: {msg_id: {
                 'payload': {
                     'headers': [
                         {'name': 'Subject', 'value': 'Fwd: Order #743234 Confirmed'},
@@ -274,8 +828,10 @@ class GmailClientDownloadTests(unittest.TestCase):
                         },
                     ],
                 }
-            }
-            client._add_label_to_message = lambda msg_id, label_id: labeled.append((msg_id, label_id))
+            } for msg_id in msg_ids}
+            client._add_label_to_messages = lambda msg_ids, label_id: labeled.extend(
+                (msg_id, label_id) for msg_id in msg_ids
+            )
 
             downloaded, total_emails, new_emails = client.fetch_and_download_new_attachments()
 
@@ -297,8 +853,8 @@ class GmailClientDownloadTests(unittest.TestCase):
             client = GmailClient(tmpdir, data_dir=tmpdir, invoices_dir=tmpdir)
             client.processed_label_id = 'label-1'
 
-            client.fetch_all_message_ids = lambda query=None: [{'id': 'msg-sb'}]
-            client.get_message_details = lambda msg_id: {
+            client.fetch_all_message_ids = lambda query=None: ['msg-sb']
+            client.get_messages_batch = lambda msg_ids, **kwargs: {msg_id: {
                 'payload': {
                     'headers': [
                         {'name': 'Subject', 'value': 'Fwd: Order #743234 Confirmed'},
@@ -308,12 +864,12 @@ class GmailClientDownloadTests(unittest.TestCase):
                         {'filename': 'daystar.pdf', 'body': {'attachmentId': 'att-1'}},
                     ],
                 }
-            }
+            } for msg_id in msg_ids}
             client.find_attachments_in_parts = lambda parts, msg_id: [
                 {'filename': 'daystar.pdf', 'attachment_id': 'att-1', 'msg_id': msg_id},
             ]
             client.download_attachment = lambda msg_id, attachment_id, filename: filename
-            client._add_label_to_message = lambda msg_id, label_id: None
+            client._add_label_to_messages = lambda msg_ids, label_id: None
 
             downloaded, _, _ = client.fetch_and_download_new_attachments()
 
@@ -322,5 +878,60 @@ class GmailClientDownloadTests(unittest.TestCase):
         self.assertNotIn('email_body_invoice', downloaded[0])
 
 
+def _http_error(status, headers=None, content=b''):
+    resp = httplib2.Response(dict({'status': status}, **(headers or {})))
+    return HttpError(resp, content)
+
+
+def _error_body(reason):
+    return json.dumps({'error': {'code': 403, 'message': reason, 'errors': [{'reason': reason}]}}).encode('utf-8')
+
+
+class RetryWithBackoffTests(unittest.TestCase):
+    def _run(self, errors):
+        calls = []
+
+        def func():
+            calls.append(1)
+            if errors:
+                raise errors.pop(0)
+            return 'ok'
+
+        with mock.patch('gmail_client.time.sleep') as sleep:
+            try:
+                result = retry_with_backoff(func)
+            except Exception as exc:
+                result = exc
+        return result, len(calls), [c.args[0] for c in sleep.call_args_list]
+
+    def test_rate_limit_honors_retry_after(self):
+        result, calls, delays = self._run([_http_error(429, {'retry-after': '7'})])
+        self.assertEqual(result, 'ok')
+        self.assertEqual(calls, 2)
+        self.assertEqual(delays, [7.0])
+
+    def test_quota_403_and_network_errors_are_retried(self):
+        result, calls, _ = self._run([
+            _http_error(403, content=_error_body('userRateLimitExceeded')),
+            ConnectionResetError('reset'),
+        ])
+        self.assertEqual(result, 'ok')
+        self.assertEqual(calls, 3)
+
+    def test_permission_403_is_not_retried(self):
+        result, calls, _ = self._run([_http_error(403, content=_error_body('insufficientPermissions'))])
+        self.assertIsInstance(result, HttpError)
+        self.assertEqual(calls, 1)
+
+    def test_client_errors_and_bugs_are_not_retried(self):
+        result, calls, delays = self._run([_http_error(404)])
+        self.assertIsInstance(result, HttpError)
+        self.assertEqual((calls, delays), (1, []))
+
+        result, calls, delays = self._run([KeyError('data')])
+        self.assertIsInstance(result, KeyError)
+        self.assertEqual((calls, delays), (1, []))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -15,8 +15,14 @@ from invoice_extractor_gui import (
     _format_time_value,
     _get_status_messages,
     _is_diamond_eye_zero_shipping_batch_row,
+    _is_invoice_filename,
+    _iter_invoice_groups,
+    _iter_row_batches,
+    load_vendor_aliases,
     _load_sender_sidecar,
     _merge_sender_metadata_entries,
+    _parse_invoice_file,
+    _parsed_cache_key,
     _parse_time_input,
     _lookup_sender_metadata_entry,
     _should_preserve_duplicate_row_fill,
@@ -59,6 +65,24 @@ class DiamondEyeBatchExportFilterTests(unittest.TestCase):
 
         self.assertFalse(_is_diamond_eye_zero_shipping_batch_row(row))
 
+
+class CsvBatchGroupingTests(unittest.TestCase):
+    def test_rows_group_by_bill_and_batches_keep_invoices_whole(self):
+        rows = [
+            {'bill_no': 'A'}, {'bill_no': ''}, {'bill_no': 'A'},
+            {'bill_no': 'B'}, {'bill_no': ''},
+            {'bill_no': 'C'},
+            {'bill_no': 'D'}, {'bill_no': ''}, {'bill_no': ''}, {'bill_no': ''},
+        ]
+
+        groups = list(_iter_invoice_groups(rows))
+        self.assertEqual([len(group) for group in groups], [3, 2, 1, 4])
+
+        batches = list(_iter_row_batches(iter(groups), row_limit=3))
+        self.assertEqual([len(batch) for batch in batches], [3, 3, 4])
+        self.assertEqual(batches[1], rows[3:6])
+
+
 class SenderMetadataLookupTests(unittest.TestCase):
     def test_falls_back_to_filename_when_source_path_misses(self):
         entries = {
@@ -156,6 +180,92 @@ class SenderMetadataLookupTests(unittest.TestCase):
         self.assertEqual(merged.get('message_id'), 'old-message')
 
 
+class ParseInvoiceFileTests(unittest.TestCase):
+    def test_parse_invoice_file_captures_logs_and_sender_fields(self):
+        def fake_parse(filepath, cb, **sender):
+            cb('  Extracting text...')
+            cb('  Extracted 3 fields', 'success')
+            return {'invoice_number': '42', 'sender': sender}
+
+        with mock.patch('invoice_extractor_gui.parse_invoice', side_effect=fake_parse):
+            invoice_data, logs, error = _parse_invoice_file(
+                'Invoice_42.pdf',
+                {'sender_email': 'ap@vendor.com', 'subject': 'Invoice 42'},
+            )
+
+        self.assertIsNone(error)
+        self.assertEqual(invoice_data['invoice_number'], '42')
+        self.assertEqual(invoice_data['sender']['sender_email'], 'ap@vendor.com')
+        self.assertEqual(invoice_data['sender']['sender_subject'], 'Invoice 42')
+        self.assertEqual(logs, [('  Extracting text...', None), ('  Extracted 3 fields', 'success')])
+
+    def test_parse_invoice_file_returns_error_text_instead_of_raising(self):
+        with mock.patch('invoice_extractor_gui.parse_email_invoice', side_effect=ValueError('bad json')):
+            invoice_data, logs, error = _parse_invoice_file('SB_Order_1.email.json')
+
+        self.assertIsNone(invoice_data)
+        self.assertEqual(logs, [])
+        self.assertEqual(error, 'bad json')
+
+    def test_parsed_cache_key_tracks_content_name_sender_vendors_and_version(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            first = os.path.join(tmpdir, 'Invoice_1.pdf')
+            same_name = os.path.join(tmpdir, 'copy', 'Invoice_1.pdf')
+            renamed = os.path.join(tmpdir, 'Fwd_Invoice_1.pdf')
+            other = os.path.join(tmpdir, 'Invoice_2.pdf')
+            vendors_csv = os.path.join(tmpdir, 'vendors.csv')
+            os.makedirs(os.path.dirname(same_name))
+            for path, content in (
+                (first, b'%PDF-1'), (same_name, b'%PDF-1'), (renamed, b'%PDF-1'),
+                (other, b'%PDF-2'), (vendors_csv, b'Vendor\nS&B Filters\n'),
+            ):
+                with open(path, 'wb') as f:
+                    f.write(content)
+            sender = {'sender_email': 'ap@vendor.com'}
+
+            with mock.patch('invoice_extractor_gui.VENDORS_CSV_PATH', vendors_csv):
+                key = _parsed_cache_key(first, sender, '1.0.0')
+                self.assertEqual(key, _parsed_cache_key(same_name, sender, '1.0.0'))
+                self.assertNotEqual(key, _parsed_cache_key(renamed, sender, '1.0.0'))
+                self.assertNotEqual(key, _parsed_cache_key(other, sender, '1.0.0'))
+
+                with open(vendors_csv, 'ab') as f:
+                    f.write(b'ATS Diesel\n')
+                self.assertNotEqual(key, _parsed_cache_key(first, sender, '1.0.0'))
+                key = _parsed_cache_key(first, sender, '1.0.0')
+                self.assertNotEqual(key, _parsed_cache_key(first, {'sender_email': 'x@y.com'}, '1.0.0'))
+                self.assertNotEqual(key, _parsed_cache_key(first, sender, '1.0.1'))
+
+
+class InvoiceFilenameTests(unittest.TestCase):
+    def test_is_invoice_filename_matches_attachments_and_body_sources(self):
+        self.assertTrue(_is_invoice_filename('Invoice_1.PDF'))
+        self.assertTrue(_is_invoice_filename('scan.tiff'))
+        self.assertTrue(_is_invoice_filename('SB_Order_1.email.json'))
+        self.assertFalse(_is_invoice_filename('Invoice_1.pdf.sender.json'))
+        self.assertFalse(_is_invoice_filename('notes.txt'))
+        self.assertFalse(_is_invoice_filename('README'))
+
+
+class VendorAliasTests(unittest.TestCase):
+    def test_load_vendor_aliases_rereads_file_only_after_it_changes(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'vendors.csv')
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                f.write('Vendor,Aliases\nS&B Filters,SB|S and B\n')
+
+            first = load_vendor_aliases(tmpdir)
+            self.assertEqual(first, {'sandbfilters': ['SB', 'S and B']})
+            self.assertIs(load_vendor_aliases(tmpdir), first)
+
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                f.write('Vendor,Aliases\nNo Limit,NL\n')
+            mtime = os.path.getmtime(path) + 5
+            os.utime(path, (mtime, mtime))
+
+            self.assertEqual(load_vendor_aliases(tmpdir), {'nolimit': ['NL']})
+
+
 class GmailTodayTimeQueryTests(unittest.TestCase):
     def test_parse_time_input_accepts_24_hour_and_ampm(self):
         self.assertEqual(_parse_time_input('14:35').strftime('%H:%M'), '14:35')
@@ -241,6 +351,15 @@ class GmailDateRangeTimeQueryTests(unittest.TestCase):
                 reference_dt=reference,
             )
 
+    def test_parse_date_input_accepts_supported_formats(self):
+        gui = InvoiceExtractorGUI.__new__(InvoiceExtractorGUI)
+        expected = datetime(2026, 4, 7).date()
+
+        for value in ('2026-04-07', '2026/04/07', '2026/4/7', '04/07/2026', '4/7/2026'):
+            self.assertEqual(gui._parse_date_input(value), expected, value)
+        for value in ('', '2026-02-30', '2026/04-07', '04-07-2026', 'today'):
+            self.assertIsNone(gui._parse_date_input(value), value)
+
 
 class GmailRangeTimePlaceholderTests(unittest.TestCase):
     def test_get_range_time_filter_value_ignores_active_placeholder(self):
@@ -283,6 +402,34 @@ class StatusMessageTests(unittest.TestCase):
         self.assertNotIn('test', [message['text'] for message in messages])
 
 
+class InvoiceHistoryIndexTests(unittest.TestCase):
+    def _make_gui(self, tmpdir):
+        gui = InvoiceExtractorGUI.__new__(InvoiceExtractorGUI)
+        gui.required_dir = tmpdir
+        gui._history_index_cache = None
+        gui.log = lambda *args, **kwargs: None
+        return gui
+
+    def test_history_indexes_reused_until_history_file_changes(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            gui = self._make_gui(tmpdir)
+            gui._append_invoice_history([
+                {'bill_no': 'INV-1', 'po_number': '1001', 'vendor': 'Acme'},
+            ])
+
+            by_po, by_bill, keys = gui._history_indexes()
+            self.assertEqual(['INV-1'], [row['bill_no'] for row in by_po['1001']])
+            self.assertIn('INV-1', by_bill)
+            self.assertIn('inv-1|1001|acme|', keys)
+            self.assertIs(by_po, gui._history_indexes()[0])
+
+            gui._append_invoice_history([
+                {'bill_no': 'INV-2', 'po_number': '1001', 'vendor': 'Acme'},
+            ])
+            by_po, _, _ = gui._history_indexes()
+            self.assertEqual(['INV-1', 'INV-2'], [row['bill_no'] for row in by_po['1001']])
+
+
 class DuplicateHighlightTests(unittest.TestCase):
     def test_preserves_stock_order_fill_when_duplicate_marked(self):
         invoice_data = {
@@ -331,5 +478,63 @@ class DuplicateHighlightTests(unittest.TestCase):
             )
 
 
+class RunPipelineSaveFailureTests(unittest.TestCase):
+    def _run_with_failing_save(self, tmpdir):
+        invoices_dir = os.path.join(tmpdir, 'Invoices')
+        os.makedirs(invoices_dir)
+        with open(os.path.join(invoices_dir, 'Invoice_1.pdf'), 'wb') as f:
+            f.write(b'%PDF-1')
+
+        gui = InvoiceExtractorGUI.__new__(InvoiceExtractorGUI)
+        gui.base_dir = gui.required_dir = tmpdir
+        gui.invoices_dir = invoices_dir
+        gui.output_file = os.path.join(tmpdir, 'invoices.xlsx')
+        gui.app_version = '1.0.0'
+        gui.is_running = True
+        gui.messages = []
+        gui.log = lambda message, tag=None: gui.messages.append(message)
+        gui.set_progress = lambda *args, **kwargs: None
+        gui.finish = mock.Mock()
+        gui._build_gmail_query = lambda: ('in:inbox', 'label', None)
+        gui._history_indexes = lambda drive_client=None: ({}, {}, set())
+        gui._append_invoice_history = mock.Mock()
+        gui._load_sender_metadata = lambda: {}
+        gui._load_parsed_cache = lambda: {}
+        gui._save_parsed_cache = lambda cache: None
+        gui._apply_duplicate_flags = mock.Mock(
+            return_value={'duplicate_invoices': 1, 'duplicate_rows': 2}
+        )
+
+        workbook = mock.Mock()
+        workbook.save.side_effect = PermissionError('file is open')
+        invoice_data = {'invoice_number': 'INV-1', 'po_number': '1001', 'vendor': 'Acme'}
+        with mock.patch('invoice_extractor_gui.GmailClient') as gmail, \
+                mock.patch('invoice_extractor_gui.DriveHistoryClient'), \
+                mock.patch('invoice_extractor_gui.PARSE_WORKERS', 1), \
+                mock.patch('invoice_extractor_gui._parse_invoice_file', return_value=(invoice_data, [], None)), \
+                mock.patch('invoice_extractor_gui.get_or_create_workbook', return_value=(workbook, None)), \
+                mock.patch('invoice_extractor_gui.write_invoice_to_spreadsheet'):
+            gmail.return_value.fetch_and_download_new_attachments.return_value = ([], 0, 0)
+            gui.run_pipeline()
+        return gui
+
+    def test_failed_workbook_save_keeps_invoices_out_of_history(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            gui = self._run_with_failing_save(tmpdir)
+
+        gui._append_invoice_history.assert_not_called()
+        self.assertIn('Invoices parsed successfully: 0', gui.messages)
+        self.assertIn('Invoices with errors: 1', gui.messages)
+        self.assertIn('  - Invoice_1.pdf', gui.messages)
+        gui.finish.assert_called_once_with('Failed - could not save output workbook.')
+
+    def test_failed_workbook_save_reports_duplicate_flags_as_not_written(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            gui = self._run_with_failing_save(tmpdir)
+
+        self.assertIn('Duplicate invoice flags not written: 1 invoice(s), 2 row(s).', gui.messages)
+        self.assertFalse(any(m.startswith('Duplicate invoices flagged') for m in gui.messages))
+
+
 if __name__ == '__main__':
     unittest.main()
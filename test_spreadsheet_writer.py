@@ -5,7 +5,14 @@ import unittest
 from invoice_parser import parse_invoice
 from openpyxl import load_workbook
 
-from spreadsheet_writer import read_spreadsheet_rows, write_invoice_to_spreadsheet, write_sku_updates
+from spreadsheet_writer import (
+    get_or_create_workbook,
+    read_spreadsheet_rows,
+    write_invoice_to_spreadsheet,
+    write_not_invoice_row,
+    write_sku_updates,
+    write_validation_results,
+)
 
 
 class SpreadsheetWriterTests(unittest.TestCase):
@@ -40,6 +47,65 @@ class SpreadsheetWriterTests(unittest.TestCase):
 
         self.assertEqual(rows[0]['sku'], '83-2004')
 
+    def test_write_validation_results_applies_sku_updates_in_same_pass(self):
+        invoice_data = {
+            'invoice_number': '743636',
+            'vendor': 'S&B Filters',
+            'date': '4/28/2026',
+            'po_number': '0064810',
+            'total': '166.83',
+            'line_items': [
+                {
+                    'item_number': '',
+                    'description': 'Hot Side Intercooler Pipe',
+                    'quantity': '1',
+                    'unit_price': '166.83',
+                    'amount': '166.83',
+                }
+            ],
+        }
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output_path = os.path.join(tmpdir, 'validation.xlsx')
+            write_invoice_to_spreadsheet(output_path, invoice_data)
+            write_validation_results(output_path, {2: (True, [])}, sku_updates={2: '83-2004'})
+            rows = read_spreadsheet_rows(output_path)
+
+        self.assertEqual(rows[0]['sku'], '83-2004')
+        self.assertEqual(rows[0]['skunexus_validation'], 'Yes')
+
+    def test_shared_workbook_writes_are_saved_by_caller(self):
+        invoice_data = {
+            'invoice_number': 'A-1',
+            'vendor': 'Acme',
+            'date': '4/28/2026',
+            'po_number': '0064810',
+            'total': '10.00',
+            'line_items': [
+                {
+                    'item_number': 'AB-123',
+                    'description': 'Widget',
+                    'quantity': '1',
+                    'unit_price': '10.00',
+                    'amount': '10.00',
+                }
+            ],
+        }
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output_path = os.path.join(tmpdir, 'shared.xlsx')
+            wb, _ = get_or_create_workbook(output_path)
+            write_invoice_to_spreadsheet(output_path, invoice_data, workbook=wb)
+            write_not_invoice_row(output_path, 'Invoices/not_invoice.pdf', workbook=wb)
+            self.assertFalse(os.path.exists(output_path))
+
+            wb.save(output_path)
+            rows = read_spreadsheet_rows(output_path)
+
+        self.assertEqual(rows[0]['bill_no'], 'A-1')
+        self.assertEqual(rows[0]['sku'], 'AB-123')
+        self.assertEqual(rows[-1]['bill_no'], 'Not an Invoice')
+
     def test_bill_no_hyperlink_prefers_source_url(self):
         invoice_data = {
             'invoice_number': '743636',